@@ -0,0 +1,307 @@
+"""Read the HALFpipe outputs from a tar or zip archive without extracting."""
+
+from __future__ import annotations
+
+import gzip
+import io
+import re
+import tarfile
+import threading
+import zipfile
+
+from pathlib import Path, PurePosixPath
+from types import SimpleNamespace
+
+import nibabel as nib
+import pandas as pd
+
+archive_suffixes = (".tar", ".tar.gz", ".tgz", ".zip")
+
+
+def is_archive(path):
+    """
+    Check a path names a supported archive.
+
+    >>> is_archive(Path("halfpipe.tar.gz")), is_archive(Path("halfpipe"))
+    (True, False)
+    """
+    return path.name.endswith(archive_suffixes)
+
+
+def _glob_to_regex(pattern):
+    """
+    Regular expression of a glob pattern, "**" matches any directories.
+
+    >>> bool(_glob_to_regex("sub-*/**/sub-*.*").fullmatch("sub-1/a/sub-1.tsv"))
+    True
+    """
+    parts = []
+    for part in pattern.split("/"):
+        if part == "**":
+            parts.append("(?:[^/]+/)*")
+        else:
+            part = re.escape(part).replace(r"\*", "[^/]*")
+            parts.append(part.replace(r"\?", "[^/]") + "/")
+    return re.compile("".join(parts).removesuffix("/"))
+
+
+class HalfpipeArchive:
+    """
+    Index of a tar, tar.gz or zip archive of the HALFpipe outputs.
+
+    The index is read once from the zip central directory or the tar
+    headers; for a tar.gz, this is a full decompression pass as tar has no
+    index. Reads are serialized, and reading a tar.gz member stored before
+    the previous one restarts the decompression from the start of the
+    archive: members should be read in the order of the archive, see
+    `read_members` and `preload`.
+
+    Args:
+        path (Path): Path to the archive.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.members = {}
+        self._cache = {}
+        if path.name.endswith(".zip"):
+            self._archive = zipfile.ZipFile(path)
+            for info in self._archive.infolist():
+                if not info.is_dir():
+                    self.members[info.filename] = info
+        else:
+            self._archive = tarfile.open(path, "r:*")
+            for info in self._archive.getmembers():
+                if info.isfile():
+                    self.members[info.name.removeprefix("./")] = info
+        self.directories = {
+            parent.as_posix()
+            for name in self.members
+            for parent in PurePosixPath(name).parents
+        }
+
+    @property
+    def root(self):
+        """
+        The HALFpipe directory in the archive: the shallowest directory
+        with a spec.json, or the top of the archive.
+        """
+        specs = [
+            PurePosixPath(name)
+            for name in self.members
+            if PurePosixPath(name).name == "spec.json"
+        ]
+        if not specs:
+            return ArchivePath(self)
+        return ArchivePath(self, min(specs, key=lambda p: len(p.parts)).parent)
+
+    def size(self, name):
+        info = self.members[name]
+        return (
+            info.file_size if isinstance(info, zipfile.ZipInfo) else info.size
+        )
+
+    def offset(self, name):
+        info = self.members[name]
+        if isinstance(info, zipfile.ZipInfo):
+            return info.header_offset
+        return info.offset_data
+
+    def preload(self, names):
+        """
+        Read small members in the order of the archive and keep them in
+        memory, for the files read several times or out of order.
+        """
+        for name in sorted(names, key=self.offset):
+            content = self.read(name)
+            with self._lock:
+                self._cache[name] = content
+
+    def read(self, name):
+        """Content of a member of the archive."""
+        info = self.members[name]
+        with self._lock:
+            if name in self._cache:
+                return self._cache[name]
+            if isinstance(info, zipfile.ZipInfo):
+                return self._archive.read(info)
+            return self._archive.extractfile(info).read()
+
+    def close(self):
+        self._archive.close()
+
+
+class ArchivePath:
+    """
+    Path to a file or directory in a `HalfpipeArchive`.
+
+    Implements the part of the `pathlib.Path` API used to find and read the
+    HALFpipe outputs, so the conversion does not need to know whether they
+    are on disk or in an archive.
+
+    Args:
+        archive (HalfpipeArchive): The archive.
+        member (str | PurePosixPath): Path in the archive.
+    """
+
+    def __init__(self, archive, member="."):
+        self.archive = archive
+        self.member = PurePosixPath(member)
+
+    def __str__(self):
+        if self._key == ".":
+            return str(self.archive.path)
+        return f"{self.archive.path}/{self.member}"
+
+    def __repr__(self):
+        return f"ArchivePath('{self}')"
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ArchivePath)
+            and self.archive is other.archive
+            and self.member == other.member
+        )
+
+    def __lt__(self, other):
+        return self.member < other.member
+
+    def __hash__(self):
+        return hash((id(self.archive), self.member))
+
+    def __truediv__(self, other):
+        return ArchivePath(self.archive, self.member / other)
+
+    def joinpath(self, *other):
+        return ArchivePath(self.archive, self.member.joinpath(*other))
+
+    @property
+    def name(self):
+        return self.member.name
+
+    @property
+    def stem(self):
+        return self.member.stem
+
+    @property
+    def suffix(self):
+        return self.member.suffix
+
+    @property
+    def parent(self):
+        return ArchivePath(self.archive, self.member.parent)
+
+    @property
+    def _key(self):
+        return self.member.as_posix()
+
+    def is_file(self):
+        return self._key in self.archive.members
+
+    def is_dir(self):
+        return self._key in self.archive.directories
+
+    def exists(self):
+        return self.is_file() or self.is_dir()
+
+    def stat(self):
+        return SimpleNamespace(st_size=self.archive.size(self._key))
+
+    def glob(self, pattern):
+        """Files of the archive matching a glob pattern (no directories)."""
+        regex = _glob_to_regex(pattern)
+        prefix = "" if self._key == "." else f"{self._key}/"
+        for name in self.archive.members:
+            if name.startswith(prefix) and regex.fullmatch(
+                name[len(prefix) :]  # noqa: E203
+            ):
+                yield ArchivePath(self.archive, name)
+
+    def read_bytes(self):
+        return self.archive.read(self._key)
+
+    def open(self, mode="r", encoding="utf-8"):
+        content = io.BytesIO(self.read_bytes())
+        if "b" in mode:
+            return content
+        return io.TextIOWrapper(content, encoding=encoding)
+
+
+def open_halfpipe_dir(path):
+    """
+    HALFpipe directory given on the command line, on disk or in an archive.
+
+    Args:
+        path (Path): A directory, or a .tar, .tar.gz or .zip archive.
+
+    Returns:
+        Path | ArchivePath: The HALFpipe directory.
+    """
+    if is_archive(path):
+        return HalfpipeArchive(path).root
+    return path
+
+
+def read_members(paths):
+    """
+    Read files of an archive in the order they are stored, so that a
+    compressed tar is read in a single forward pass after its index.
+
+    Files on disk are not read, their content is None so that they can be
+    read in parallel by the task processing them.
+
+    Args:
+        paths (list[Path | ArchivePath]): Files on disk or of the same
+            archive.
+
+    Yields:
+        tuple[Path | ArchivePath, bytes | None]: Each path and its content.
+    """
+    if not any(isinstance(path, ArchivePath) for path in paths):
+        for path in paths:
+            yield path, None
+        return
+    for path in sorted(paths, key=lambda p: p.archive.offset(p._key)):
+        yield path, path.read_bytes()
+
+
+def load_nifti(path):
+    """
+    Load a NIfTI image on disk or in an archive.
+
+    Args:
+        path (Path | ArchivePath): A .nii or .nii.gz file.
+
+    Returns:
+        Path | nibabel.Nifti1Image: The path itself if it is on disk,
+            nilearn loads it.
+    """
+    if isinstance(path, Path):
+        return path
+    content = path.read_bytes()
+    if path.name.endswith(".gz"):
+        content = gzip.decompress(content)
+    return nib.Nifti1Image.from_bytes(content)
+
+
+def read_tsv(src, content=None, **kwargs):
+    """
+    Read a TSV file on disk or in an archive, can be gzip compressed.
+
+    Args:
+        src (Path | ArchivePath): The file.
+        content (bytes): Content of `src`, if it was already read.
+        **kwargs: Passed to `pandas.read_csv`.
+
+    Returns:
+        pandas.DataFrame
+    """
+    if content is None and isinstance(src, Path):
+        return pd.read_csv(src, sep="\t", **kwargs)
+    if content is None:
+        content = src.read_bytes()
+    compression = "gzip" if src.name.endswith(".gz") else None
+    return pd.read_csv(
+        io.BytesIO(content), sep="\t", compression=compression, **kwargs
+    )
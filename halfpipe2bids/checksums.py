@@ -0,0 +1,147 @@
+"""SHA256 checksums of the output files, computed while they are written."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_NAME = "SHA256SUMS"
+CHUNK_SIZE = 2**20
+
+_active_manifest = None
+
+
+class ChecksumManifest:
+    """
+    SHA256 checksums of the files of a BIDS output directory.
+
+    The manifest uses the format of `sha256sum`, so it can also be checked
+    with `sha256sum -c SHA256SUMS` from the output directory.
+
+    Args:
+        output_dir (Path): The BIDS output directory.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = output_dir / MANIFEST_NAME
+        self.checksums = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, output_dir):
+        """Read the manifest of an output directory, if there is one."""
+        manifest = cls(output_dir)
+        if manifest.path.exists():
+            with open(manifest.path, "r") as f:
+                for line in f:
+                    digest, name = line.rstrip("\n").split("  ", 1)
+                    manifest.checksums[name] = digest
+        return manifest
+
+    def add(self, path, digest):
+        """Record the checksum of a file of the output directory."""
+        try:
+            name = path.relative_to(self.output_dir).as_posix()
+        except ValueError:  # not part of the output directory
+            return
+        with self._lock:
+            self.checksums[name] = digest
+
+    def write(self):
+        """
+        Write the manifest, leaving out files that no longer exist.
+
+        Returns:
+            Path: Path to the manifest.
+        """
+        with self._lock:
+            self.checksums = {
+                name: digest
+                for name, digest in sorted(self.checksums.items())
+                if (self.output_dir / name).exists()
+            }
+            with open(self.path, "w") as f:
+                for name, digest in self.checksums.items():
+                    f.write(f"{digest}  {name}\n")
+        return self.path
+
+
+def start_manifest(output_dir):
+    """
+    Record the checksum of every file written in the output directory from
+    now on. Checksums of a former run in the same directory are kept.
+
+    Returns:
+        ChecksumManifest
+    """
+    global _active_manifest
+    _active_manifest = ChecksumManifest.load(output_dir)
+    return _active_manifest
+
+
+def stop_manifest():
+    """Stop recording checksums and write the manifest."""
+    global _active_manifest
+    manifest, _active_manifest = _active_manifest, None
+    if manifest is not None:
+        return manifest.write()
+
+
+def record_checksum(path, digest):
+    """Add a checksum to the active manifest, if any."""
+    if _active_manifest is not None:
+        _active_manifest.add(path, digest)
+
+
+def file_checksum(path):
+    """SHA256 of a file, read in chunks."""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def verify(output_dir, n_workers=None):
+    """
+    Check the files of an output directory against its manifest.
+
+    The files are hashed in parallel threads.
+
+    Args:
+        output_dir (Path): The BIDS output directory.
+        n_workers (int): Number of threads. Default: number of CPUs.
+
+    Returns:
+        dict[str, list[str]]: Files that are "missing", "modified", or
+            "unlisted" (present but not in the manifest).
+    """
+    manifest = ChecksumManifest.load(output_dir)
+    if not manifest.path.exists():
+        raise FileNotFoundError(f"No {MANIFEST_NAME} in {output_dir}")
+
+    def _check(item):
+        name, digest = item
+        path = output_dir / name
+        if not path.is_file():
+            return "missing", name
+        if file_checksum(path) != digest:
+            return "modified", name
+        return None, name
+
+    report = {"missing": [], "modified": [], "unlisted": []}
+    with ThreadPoolExecutor(n_workers or os.cpu_count()) as executor:
+        for status, name in executor.map(_check, manifest.checksums.items()):
+            if status is not None:
+                report[status].append(name)
+
+    listed = set(manifest.checksums) | {MANIFEST_NAME}
+    for path in sorted(output_dir.rglob("*")):
+        name = path.relative_to(output_dir).as_posix()
+        if path.is_file() and name not in listed:
+            report["unlisted"].append(name)
+    return report
@@ -0,0 +1,132 @@
+"""Functional connectivity measures computed from the timeseries."""
+
+from __future__ import annotations
+
+import threading
+
+import numpy as np
+
+from nilearn.connectome import ConnectivityMeasure, prec_to_partial
+from scipy import linalg
+
+default_measures = ["covariance", "PearsonCorrelation"]
+extra_measures = ["PartialCorrelation", "FisherZ", "Tangent"]
+
+
+def _map_eigenvalues(function, symmetric):
+    """Apply a function to the eigenvalues of a symmetric matrix."""
+    eigenvalues, eigenvectors = linalg.eigh(symmetric)
+    return (eigenvectors * function(eigenvalues)) @ eigenvectors.T
+
+
+def fisher_z(correlation):
+    """
+    Fisher z-transform of a correlation matrix.
+
+    The diagonal is set to 0 as the transform is infinite for 1.
+
+    >>> fisher_z(np.array([[1.0, 0.5], [0.5, 1.0]])).round(4)
+    array([[0.    , 0.5493],
+           [0.5493, 0.    ]])
+    """
+    with np.errstate(divide="ignore"):
+        z = np.arctanh(np.clip(correlation, -1, 1))
+    np.fill_diagonal(z, 0)
+    return z
+
+
+def compute_connectomes(timeseries, measures=None):
+    """
+    Compute the connectomes of one timeseries.
+
+    The covariance is estimated once (Ledoit-Wolf) and reused for the
+    partial correlation. The Fisher z-transform reuses the Pearson
+    correlation. The tangent space embedding needs the whole group, see
+    `TangentSpace`.
+
+    The connectomes have the precision of the timeseries, so float32
+    timeseries give float32 connectomes.
+
+    Args:
+        timeseries (numpy.ndarray): Volumes x parcels, without NaN.
+        measures (list[str]): Measures to compute on top of the default
+            covariance and Pearson correlation.
+
+    Returns:
+        dict[str, numpy.ndarray]: Connectome of each measure.
+    """
+    measures = measures or []
+    covariance = ConnectivityMeasure(kind="covariance").fit_transform(
+        [timeseries]
+    )[0]
+    correlation = ConnectivityMeasure(kind="correlation").fit_transform(
+        [timeseries]
+    )[0]
+    connectomes = {"covariance": covariance, "PearsonCorrelation": correlation}
+    if "PartialCorrelation" in measures:
+        connectomes["PartialCorrelation"] = prec_to_partial(
+            linalg.inv(covariance)
+        )
+    if "FisherZ" in measures:
+        connectomes["FisherZ"] = fisher_z(correlation)
+    return {
+        measure: relmat.astype(timeseries.dtype, copy=False)
+        for measure, relmat in connectomes.items()
+    }
+
+
+class TangentSpace:
+    """
+    Tangent space embedding of covariance matrices, fitted one subject at a
+    time.
+
+    The reference point is the log-Euclidean mean of the covariances,
+    expm(mean(logm(C))), which can be accumulated as a running sum so the
+    covariances of the group are never held in memory together. nilearn
+    uses the iterative geometric mean instead; the log-Euclidean mean is its
+    usual closed-form approximation. Each covariance C is then projected
+    as logm(W C W), with W the inverse square root of the reference.
+
+    The reference is accumulated in float64 whatever the precision of the
+    covariances, the projections keep the precision of their input.
+
+    `partial_fit` is thread safe.
+    """
+
+    def __init__(self):
+        self.n_samples_ = 0
+        self._log_sum = None
+        self._whitening = None
+        self._lock = threading.Lock()
+
+    def partial_fit(self, covariance):
+        """Add one covariance matrix to the reference point."""
+        log_covariance = _map_eigenvalues(np.log, covariance)
+        with self._lock:
+            if self._log_sum is None:
+                self._log_sum = np.zeros_like(log_covariance, dtype=np.float64)
+            self._log_sum += log_covariance
+            self.n_samples_ += 1
+            self._whitening = None
+        return self
+
+    @property
+    def mean_(self):
+        if self.n_samples_ == 0:
+            raise ValueError("TangentSpace has not been fitted.")
+        return _map_eigenvalues(np.exp, self._log_sum / self.n_samples_)
+
+    @property
+    def whitening_(self):
+        if self._whitening is None:
+            self._whitening = _map_eigenvalues(
+                lambda x: 1.0 / np.sqrt(x), self.mean_
+            )
+        return self._whitening
+
+    def transform(self, covariance):
+        """Project one covariance matrix to the tangent space."""
+        whitening = self.whitening_
+        return _map_eigenvalues(
+            np.log, whitening @ covariance @ whitening
+        ).astype(covariance.dtype, copy=False)
@@ -2,20 +2,129 @@
 
 from __future__ import annotations
 
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
 
+from rich.console import Console
 from rich.logging import RichHandler
 
+# records of all threads go through one queue, a single listener thread
+# formats them and writes them to the console and the log file
+_log_queue = queue.SimpleQueue()
+_listener = None
+_log_file_handler = None
 
-def hp2b_logger(log_level: str = "INFO") -> logging.Logger:
-    # FORMAT = '\n%(asctime)s - %(name)s - %(levelname)s\n\t%(message)s\n'
-    FORMAT = "%(message)s"
-
-    logging.basicConfig(
-        level=log_level,
-        format=FORMAT,
-        datefmt="[%X]",
-        handlers=[RichHandler()],
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler keeping the message and the traceback apart.
+
+    `QueueHandler.prepare` folds the traceback into the message and drops
+    the exception, which cannot be pickled or formatted in another thread.
+    They are also kept as "raw_message" and "exception" for the JSON lines.
+    """
+
+    def prepare(self, record):
+        message = record.getMessage()
+        exception = None
+        if record.exc_info:
+            exception = logging.Formatter().formatException(record.exc_info)
+        record = super().prepare(record)
+        record.raw_message = message
+        record.exception = exception
+        return record
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format each record as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": getattr(record, "raw_message", record.getMessage()),
+        }
+        if getattr(record, "exception", None):
+            entry["exception"] = record.exception
+        return json.dumps(entry, default=str)
+
+
+def _console_handler():
+    # stderr, as the records are written asynchronously they would
+    # interleave with the conversion plan printed on stdout
+    handler = RichHandler(console=Console(stderr=True))
+    handler.setFormatter(logging.Formatter("%(message)s", datefmt="[%X]"))
+    return handler
+
+
+def _start_listener(handlers):
+    global _listener
+    if _listener is not None:
+        _listener.stop()  # writes the records still in the queue
+    _listener = logging.handlers.QueueListener(
+        _log_queue, *handlers, respect_handler_level=True
     )
+    _listener.start()
+
+
+def flush_logging() -> None:
+    """
+    Write the records still in the queue, e.g. the errors logged before an
+    exception propagates, so they are not printed after its traceback.
+    """
+    if _listener is not None:
+        _start_listener(_listener.handlers)
+
+
+def stop_logging() -> None:
+    """Write the pending records and stop the listener thread."""
+    global _listener, _log_file_handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _log_file_handler is not None:
+        _log_file_handler.close()
+        _log_file_handler = None
+
+
+def set_log_file(path) -> None:
+    """
+    Also write the log to a file, as JSON lines.
+
+    Args:
+        path (Path | None): The log file, appended to if it exists. None to
+            stop writing to the current log file.
+    """
+    global _log_file_handler
+    handlers = [_console_handler()]
+    if _log_file_handler is not None:
+        _log_file_handler.close()
+        _log_file_handler = None
+    if path is not None:
+        _log_file_handler = logging.FileHandler(path, encoding="utf-8")
+        _log_file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(_log_file_handler)
+    _start_listener(handlers)
+
+
+def hp2b_logger(log_level: str = "INFO") -> logging.Logger:
+    """
+    The package logger.
 
-    return logging.getLogger("halfpipe2bids")
+    The calling threads only put the records on a queue, the formatting
+    and writing happen in a listener thread. Messages should use lazy
+    formatting, e.g. `hp2b_log.debug("Renaming %s", src)`, so records
+    below the log level cost a single level check.
+    """
+    logger = logging.getLogger("halfpipe2bids")
+    if not logger.handlers:
+        logger.setLevel(log_level)
+        logger.addHandler(_QueueHandler(_log_queue))
+        _start_listener([_console_handler()])
+        atexit.register(stop_logging)
+    return logger
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
-import shutil
+import contextlib
 import json
+import sys
+import numpy as np
 import pandas as pd
 import argparse
 
@@ -9,11 +11,45 @@ from pathlib import Path
 from typing import Sequence
 from nilearn.plotting import find_parcellation_cut_coords
 
-from tqdm import tqdm
 from halfpipe2bids import __version__
+from halfpipe2bids import checksums
+from halfpipe2bids import preflight
+from halfpipe2bids.archive import (
+    ArchivePath,
+    is_archive,
+    load_nifti,
+    open_halfpipe_dir,
+    read_members,
+    read_tsv,
+)
+from halfpipe2bids.connectome import (
+    TangentSpace,
+    compute_connectomes,
+    default_measures,
+    extra_measures,
+)
 from halfpipe2bids import utils as hp2b_utils
-from halfpipe2bids.logger import hp2b_logger
-from nilearn.connectome import ConnectivityMeasure
+from halfpipe2bids.logger import flush_logging, hp2b_logger, set_log_file
+from halfpipe2bids.parquet import export_parquet, parquet_layouts
+from halfpipe2bids.qc import GroupQC
+from halfpipe2bids.scheduler import (
+    MemoryBudgetExecutor,
+    estimate_memory,
+    parse_memory_size,
+    peak_rss,
+)
+from halfpipe2bids.sparse import (
+    create_sparse_metadata_json,
+    write_sparse_relmat,
+)
+from halfpipe2bids.watch import watch
+from halfpipe2bids.writers import (
+    copy_file,
+    tsv_path,
+    write_bytes,
+    write_json,
+    write_tsv,
+)
 
 hp2b_log = hp2b_logger()
 
@@ -31,6 +67,30 @@ def set_verbosity(verbosity: int | list[int]) -> None:
         hp2b_log.setLevel("DEBUG")
 
 
+def positive_int(value: str) -> int:
+    """Number of edges kept per parcel, at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def non_negative_float(value: str) -> float:
+    """Absolute weight threshold, 0 or more."""
+    number = float(value)
+    if not number >= 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, got {value}")
+    return number
+
+
+def proportion(value: str) -> float:
+    """Proportion of the edges kept, in (0, 1]."""
+    number = float(value)
+    if not 0 < number <= 1:
+        raise argparse.ArgumentTypeError(f"must be in (0, 1], got {value}")
+    return number
+
+
 def global_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         formatter_class=argparse.RawTextHelpFormatter,
@@ -38,12 +98,17 @@ def global_parser() -> argparse.ArgumentParser:
             "Convert neuroimaging data from the HalfPipe format to the "
             "standardized BIDS (Brain Imaging Data Structure) format."
         ),
+        epilog=(
+            "To check a converted dataset against its checksums, run:\n"
+            "  halfpipe2bids-verify output_dir"
+        ),
     )
     parser.add_argument(
         "halfpipe_dir",
         action="store",
         type=Path,
-        help="The directory with the HALFPipe output.",
+        help="The directory with the HALFPipe output, or a .tar, .tar.gz "
+        "or .zip archive\nof it. Archives are read without extracting them.",
     )
     parser.add_argument(
         "output_dir",
@@ -67,6 +132,104 @@ def global_parser() -> argparse.ArgumentParser:
         help="Imputation and bad ROI removal.",
         action="store_true",
     )
+    parser.add_argument(
+        "--compress",
+        help="Write gzip compressed timeseries and connectomes (.tsv.gz).",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--dtype",
+        help="Precision of the NaN imputation, the connectomes and the "
+        "sparse and Parquet\noutputs. float32 halves the memory of large "
+        "atlases. The renamed HALFpipe\nfiles keep their precision. "
+        "Default: float64.",
+        choices=["float64", "float32"],
+        default="float64",
+    )
+    parser.add_argument(
+        "--measures",
+        help="Additional connectivity measures computed with --impute-nan."
+        "\nTangent is fitted on all subjects of each task, atlas and "
+        "denoising feature.",
+        nargs="+",
+        choices=extra_measures,
+        default=[],
+    )
+    sparse = parser.add_mutually_exclusive_group()
+    sparse.add_argument(
+        "--sparse-top-k",
+        help="Also save sparse connectomes keeping the K strongest "
+        "edges of each parcel.",
+        type=positive_int,
+        metavar="K",
+    )
+    sparse.add_argument(
+        "--sparse-threshold",
+        help="Also save sparse connectomes keeping the edges with an "
+        "absolute weight\nat or above the threshold.",
+        type=non_negative_float,
+    )
+    sparse.add_argument(
+        "--sparse-proportion",
+        help="Also save sparse connectomes keeping this proportion "
+        "(0-1] of the\nstrongest edges.",
+        type=proportion,
+    )
+    parser.add_argument(
+        "--parquet",
+        help="Export timeseries and run metadata to Parquet. The timeseries "
+        "can be stored\nin long (one row per volume and parcel) or wide "
+        "format. Default: long.\nRequires pyarrow.",
+        nargs="?",
+        const="long",
+        choices=parquet_layouts,
+    )
+    parser.add_argument(
+        "--mem-budget",
+        help="Memory budget, e.g. 8G. Files are processed in parallel as "
+        "long as their\nestimated memory fits in the budget. Default: no "
+        "limit.",
+        type=parse_memory_size,
+    )
+    parser.add_argument(
+        "--n-workers",
+        help="Maximum number of files processed in parallel. Default: "
+        "number of CPUs.",
+        type=int,
+    )
+    parser.add_argument(
+        "--watch",
+        help="Convert each subject as soon as HALFpipe has written all its "
+        "outputs, while\nHALFpipe is still running. The dataset-level steps "
+        "run once no file has\nchanged for --watch-timeout seconds.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        help="Seconds between two checks of the HALFpipe outputs. "
+        "Default: 60.",
+        type=float,
+        default=60,
+    )
+    parser.add_argument(
+        "--watch-timeout",
+        help="Stop watching after this many seconds without any new or "
+        "changed file.\nDefault: 3600.",
+        type=float,
+        default=3600,
+    )
+    parser.add_argument(
+        "--dry-run",
+        help="Check the inputs and print the conversion plan without "
+        "writing any file.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--log-file",
+        help="Also write the log to this file as JSON lines, one object per "
+        "record.",
+        type=Path,
+    )
     parser.add_argument(
         "-v",
         "--version",
@@ -85,10 +248,211 @@ def global_parser() -> argparse.ArgumentParser:
     return parser
 
 
+def get_sparse_option(args: argparse.Namespace) -> tuple | None:
+    """
+    Sparsification method and value requested, if any. The workflow adds
+    the number of parcels of the atlas, see `write_sparse_relmat`.
+    """
+    for method, value in [
+        ("top-k", args.sparse_top_k),
+        ("threshold", args.sparse_threshold),
+        ("proportion", args.sparse_proportion),
+    ]:
+        if value is not None:
+            return method, value
+    return None
+
+
+def convert_file(
+    src: Path,
+    dst: Path,
+    compress: bool = False,
+    sparse: tuple | None = None,
+    dtype: str | None = None,
+    content: bytes | None = None,
+    group_qc: GroupQC | None = None,
+) -> None:
+    """
+    Copy one HALFpipe output file to its BIDS destination.
+
+    `content` is the content of `src` when it was already read from an
+    archive. The NaN coverage of the timeseries is added to `group_qc`.
+    The TSV files keep the precision of HALFpipe, `dtype` only applies to
+    the sparse connectomes.
+    """
+    if not dst.parent.exists():
+        dst.parent.mkdir(parents=True, exist_ok=True)
+    hp2b_log.debug("Renaming %s to %s", src, dst)
+    if dst.name.endswith((".tsv", ".tsv.gz")):
+        # add columns and use atlas index
+        mat = read_tsv(src, content, header=None, na_values="nan")
+        mat.columns += 1
+        write_tsv(mat, dst, compress, index=False)
+        if group_qc is not None and "_timeseries" in dst.name:
+            group_qc.add_nan_coverage(dst, mat.isna())
+        if sparse and "_relmat" in dst.name:
+            if dtype is not None:
+                mat = mat.astype(dtype)
+            write_sparse_relmat(mat, dst, *sparse)
+    elif content is not None:
+        write_bytes(dst, content)
+    else:
+        copy_file(src, dst)  # keeps the file metadata, as shutil.copy2
+
+
+def get_relmat_filename(path_timeseries: Path, measure: str) -> Path:
+    """Path of the connectome of a timeseries."""
+    return path_timeseries.with_name(
+        path_timeseries.name.replace("timeseries", f"meas-{measure}_relmat")
+    )
+
+
+def get_group_key(path_timeseries: Path) -> str:
+    """Entities shared by a group of subjects, e.g. task, atlas, feature."""
+    return path_timeseries.name.split(".")[0].split("_", 1)[-1]
+
+
+def write_relmat(
+    relmat,
+    path_timeseries: Path,
+    measure: str,
+    columns: pd.Index,
+    compress: bool = False,
+    sparse: tuple | None = None,
+) -> None:
+    """Write a connectome and its sparse version next to the timeseries."""
+    dst = get_relmat_filename(path_timeseries, measure)
+    df_relmat = pd.DataFrame(relmat, columns=columns)
+    write_tsv(df_relmat, dst, compress, index=False)
+    if sparse:
+        write_sparse_relmat(df_relmat, dst, *sparse)
+
+
+def impute_timeseries(
+    path_timeseries: Path,
+    keep: list[str],
+    compress: bool = False,
+    sparse: tuple | None = None,
+    measures: list[str] | None = None,
+    tangent_space: TangentSpace | None = None,
+    dtype: str | None = None,
+) -> None:
+    """Impute NaN in one timeseries and recalculate its connectomes."""
+    # replace nan with row means (mean value of all parcels per TR)
+    df = pd.read_csv(
+        path_timeseries, sep="\t", header=0, na_values="nan", dtype=dtype
+    )
+    df = df.loc[:, keep]
+    row_means = df.mean(axis=1, skipna=True)  # global mean per TR
+    df_imputed = df.T.fillna(row_means).T
+    write_tsv(df_imputed, path_timeseries, compress, index=False)
+    hp2b_log.debug("Imputed %s %s", path_timeseries, df_imputed.shape)
+    # recreate the functional connectivity
+    connectomes = compute_connectomes(df_imputed.values, measures)
+    for relmat_type, relmat in connectomes.items():
+        write_relmat(
+            relmat,
+            path_timeseries,
+            relmat_type,
+            df_imputed.columns,
+            compress,
+            sparse,
+        )
+    if tangent_space is not None:
+        tangent_space.partial_fit(connectomes["covariance"])
+
+
+def project_tangent(
+    path_timeseries: Path,
+    tangent_space: TangentSpace,
+    compress: bool = False,
+    sparse: tuple | None = None,
+    dtype: str | None = None,
+) -> None:
+    """Tangent space connectome from the covariance written at imputation."""
+    path_covariance = tsv_path(
+        get_relmat_filename(path_timeseries, "covariance"), compress
+    )
+    covariance = pd.read_csv(path_covariance, sep="\t", header=0, dtype=dtype)
+    relmat = tangent_space.transform(covariance.values)
+    write_relmat(
+        relmat,
+        path_timeseries,
+        "Tangent",
+        covariance.columns,
+        compress,
+        sparse,
+    )
+
+
+def rename_files(
+    index: pd.DataFrame,
+    executor: MemoryBudgetExecutor,
+    compress: bool = False,
+    sparse: tuple | None = None,
+    dtype: str | None = None,
+    group_qc: GroupQC | None = None,
+) -> None:
+    """
+    Convert all the files of an index, see `convert_file`.
+
+    Files in an archive are read one at a time in the order they are stored
+    and converted in parallel as their memory fits in the budget.
+    """
+    files = {
+        src: (size, dst)
+        for src, size, dst in index[["src", "size", "dst"]].values
+    }
+
+    def _cost(src):
+        size, dst = files[src]
+        if dst.name.endswith((".tsv", ".tsv.gz")):
+            return estimate_memory(size, src.suffix == ".gz")
+        return 0
+
+    if any(isinstance(src, ArchivePath) for src in files):
+        tasks = (
+            (
+                (
+                    src,
+                    files[src][1],
+                    compress,
+                    sparse,
+                    dtype,
+                    content,
+                    group_qc,
+                ),
+                _cost(src) + len(content),
+            )
+            for src, content in read_members(files)
+        )
+    else:
+        tasks = [
+            ((src, dst, compress, sparse, dtype, None, group_qc), _cost(src))
+            for src, (_, dst) in files.items()
+        ]
+    executor.run(convert_file, tasks, desc="Renaming files", total=len(files))
+
+
+def log_peak_memory(stage: str) -> None:
+    peak = peak_rss()
+    if peak is not None:
+        hp2b_log.info(f"Peak memory after {stage}: {peak / 1024**2:.0f} MiB")
+
+
 def workflow(args: argparse.Namespace) -> None:
+    # the archive, the worker threads and the checksum manifest are also
+    # released when a stage fails
+    with contextlib.ExitStack() as cleanup:
+        _workflow(args, cleanup)
+
+
+def _workflow(args: argparse.Namespace, cleanup: contextlib.ExitStack) -> None:
     hp2b_log.info(vars(args))
     output_dir = args.output_dir
-    halfpipe_dir = args.halfpipe_dir
+    halfpipe_dir = open_halfpipe_dir(args.halfpipe_dir)
+    if isinstance(halfpipe_dir, ArchivePath):
+        cleanup.callback(halfpipe_dir.archive.close)
 
     path_derivatives = halfpipe_dir / "derivatives"
     path_halfpipe_timeseries = path_derivatives / "halfpipe"
@@ -103,57 +467,174 @@ def workflow(args: argparse.Namespace) -> None:
 
     set_verbosity(args.verbosity)
 
-    with open(path_halfpipe_spec, "r") as f:
+    sparse = get_sparse_option(args)
+    if args.watch:
+        # the subjects are indexed and checked as they are completed
+        index = None
+        errors = preflight.check_dataset_files(
+            path_halfpipe_spec,
+            path_atlas_label,
+            path_atlas_nii,
+            denoise_metadata=args.denoise_metadata,
+            impute_nan=args.impute_nan,
+            sparse=sparse is not None,
+        )
+    else:
+        hp2b_log.info(f"Index HALFpipe outputs in {path_halfpipe_timeseries}")
+        index = preflight.index_halfpipe_outputs(
+            path_halfpipe_timeseries, output_dir
+        )
+        errors = preflight.check_inputs(
+            index,
+            path_halfpipe_spec,
+            path_atlas_label,
+            path_atlas_nii,
+            path_fmriprep,
+            denoise_metadata=args.denoise_metadata,
+            impute_nan=args.impute_nan,
+            sparse=sparse is not None,
+        )
+    if args.dry_run:
+        plan = preflight.plan_conversion(index, path_fmriprep, args)
+        preflight.print_plan(plan, errors)
+        if errors:
+            raise SystemExit(1)
+        return
+    if errors:
+        for error in errors:
+            hp2b_log.error(error)
+        raise ValueError(
+            f"{len(errors)} problem(s) found in {halfpipe_dir}, "
+            "nothing was converted. Use --dry-run to review the inputs."
+        )
+
+    if isinstance(halfpipe_dir, ArchivePath):
+        # read several times, or after the outputs
+        preloaded = [path_halfpipe_spec, path_atlas_label]
+        if args.denoise_metadata:
+            preloaded.append(path_atlas_nii)
+        halfpipe_dir.archive.preload(
+            [p._key for p in preloaded if p.is_file()]
+        )
+    with path_halfpipe_spec.open("r") as f:
         halfpipe_spec = json.load(f)
     if not output_dir.exists():
         output_dir.mkdir(parents=True, exist_ok=True)
+    checksums.start_manifest(output_dir)
+    cleanup.callback(checksums.stop_manifest)
+    if sparse:
+        # the sparse connectomes are indexed by the parcels of the atlas
+        parcel_index = hp2b_utils.load_atlas_info_tsv(path_atlas_label).index
+        sparse = (*sparse, int(parcel_index.max()))
+    executor = MemoryBudgetExecutor(args.mem_budget, args.n_workers)
+    cleanup.callback(executor.shutdown)
+    group_qc = GroupQC()
+
+    failed_subjects = set()
+    if args.watch:
 
+        def convert_subject(subject: str) -> None:
+            subject_index = preflight.index_halfpipe_outputs(
+                path_halfpipe_timeseries, output_dir, subject
+            )
+            subject_errors = preflight.check_index(
+                subject_index,
+                path_fmriprep,
+                denoise_metadata=args.denoise_metadata,
+                impute_nan=args.impute_nan,
+            )
+            if subject_errors:
+                for error in subject_errors:
+                    hp2b_log.error(error)
+                failed_subjects.add(subject)
+                return
+            failed_subjects.discard(subject)
+            rename_files(
+                subject_index,
+                executor,
+                args.compress,
+                sparse,
+                args.dtype,
+                group_qc,
+            )
+
+        hp2b_log.info(f"Watching {path_halfpipe_timeseries} for subjects.")
+        watch(
+            path_halfpipe_timeseries,
+            convert_subject,
+            interval=args.watch_interval,
+            timeout=args.watch_timeout,
+        )
+    else:
+        hp2b_log.info(f"Copy all files to the output directory: {output_dir}")
+        rename_files(
+            index, executor, args.compress, sparse, args.dtype, group_qc
+        )
+    log_peak_memory("renaming")
+
+    # dataset-level steps, once all the subjects are converted
     hp2b_log.info("Create dataset-level metadata.")
+    measures = default_measures + (args.measures if args.impute_nan else [])
     hp2b_utils.create_dataset_metadata_json(
-        output_dir, halfpipe_spec, path_atlas_nii
+        output_dir, halfpipe_spec, path_atlas_nii, measures
     )
-    all_files = path_halfpipe_timeseries.glob("sub-*/**/sub-*.*")
-
-    hp2b_log.info(f"Copy all files to the output directory: {output_dir}")
-    for src in tqdm(all_files, desc="Renaming files"):
-
-        dst = hp2b_utils.get_bids_filename(src, output_dir)
-        if not dst.parent.exists():
-            dst.parent.mkdir(parents=True, exist_ok=True)
-        hp2b_log.debug(f"Renaming {src} to {dst}")
-        if ".tsv" == src.suffix:  # add columns and use atlas index
-            mat = pd.read_csv(src, sep="\t", header=None, na_values="nan")
-            mat.columns += 1
-            mat.to_csv(dst, index=False, sep="\t", na_rep="nan")
-        else:
-            shutil.copy2(src, dst)  # copy2 to preserve metadata
+    if sparse:
+        create_sparse_metadata_json(output_dir, *sparse[:2], measures)
 
     if args.denoise_metadata:
         # populate timeseries.json with extra information
         seg_meta_json = list(output_dir.glob("seg-*.json"))[0]
-        all_meta_json = output_dir.glob("sub-*/**/*_timeseries.json")
+        all_meta_json = sorted(output_dir.glob("sub-*/**/*_timeseries.json"))
+        # the features of a run share one confound file, which is read once
+        # (in the order of the archive, if any)
+        meta_json_per_confounds = {}
         for ts_jsons in all_meta_json:
-            hp2b_utils.populate_timeseries_json(ts_jsons, path_fmriprep)
+            confound_file = hp2b_utils.get_confound_file(
+                ts_jsons, path_fmriprep
+            )
+            meta_json_per_confounds.setdefault(confound_file, []).append(
+                ts_jsons
+            )
+        scheduled_json = []
+
+        def denoise_tasks():
+            for confound_file, content in read_members(
+                list(meta_json_per_confounds)
+            ):
+                cost = estimate_memory(confound_file.stat().st_size)
+                for ts_jsons in meta_json_per_confounds[confound_file]:
+                    scheduled_json.append(ts_jsons)
+                    yield (ts_jsons, path_fmriprep, content), cost
+
+        extra_metas = executor.run(
+            hp2b_utils.populate_timeseries_json,
+            denoise_tasks(),
+            desc="Adding denoising metadata",
+            total=len(all_meta_json),
+        )
+        for ts_jsons, extra_meta in zip(scheduled_json, extra_metas):
+            group_qc.add_denoise_metadata(ts_jsons, extra_meta)
 
         atlas_label = hp2b_utils.load_atlas_info_tsv(path_atlas_label)
-        coords = find_parcellation_cut_coords(path_atlas_nii)
+        coords = find_parcellation_cut_coords(load_nifti(path_atlas_nii))
         df_coords = pd.DataFrame(
             coords, columns=["x", "y", "z"], index=atlas_label.index
         )
         atlas_label = pd.concat([atlas_label, df_coords], axis=1)
-        atlas_label.to_csv(
-            output_dir / f"{seg_meta_json.stem}.tsv", index=True, sep="\t"
-        )
+        write_tsv(atlas_label, output_dir / f"{seg_meta_json.stem}.tsv")
 
     if args.impute_nan:
         hp2b_log.info("Impute NaN with grand mean per TR.")
         parcel_removal_threshold = 0.5
         seg_meta_df = hp2b_utils.load_atlas_info_tsv(path_atlas_label)
         atlas_label = seg_meta_df.index.tolist()
-        timeseries_paths = list(output_dir.glob("sub-*/**/*_timeseries.tsv"))
+        timeseries_paths = list(output_dir.glob("sub-*/**/*_timeseries.tsv*"))
         # find parcels coverage stats at dataset level
         dataset_nan_info, keep, drop = hp2b_utils.find_bad_rois(
-            timeseries_paths, atlas_label, parcel_removal_threshold
+            timeseries_paths,
+            atlas_label,
+            parcel_removal_threshold,
+            dtype=args.dtype,
         )
         hp2b_log.info(
             "add nan imputation related information to the segmentation "
@@ -175,49 +656,149 @@ def workflow(args: argparse.Namespace) -> None:
             "ParcelsRemoved": drop,
         }
         seg_metadata.update(seg_metadata_exta)
-        with open(seg_meta_json, "w") as f:
-            json.dump(seg_metadata, f, indent=4)
+        write_json(seg_metadata, seg_meta_json)
 
         dataset_nan_info.index = seg_meta_df.index
         seg_meta_df = pd.concat([seg_meta_df, dataset_nan_info], axis=1)
-        seg_meta_df.to_csv(seg_meta_tsv, sep="\t")
+        write_tsv(seg_meta_df, seg_meta_tsv)
 
         hp2b_log.info(
             f"Dropping {len(seg_metadata_exta['ParcelsRemoved'])} "
             f"ROIs due to {parcel_removal_threshold*100}% of the "
             "subject have no signal these regions."
         )
-        # replace nan with row means (mean value of all parcels per TR)
-        relmat_calculation = {
-            "covariance": ConnectivityMeasure(kind="covariance"),
-            "PearsonCorrelation": ConnectivityMeasure(kind="correlation"),
+        # the connectomes add a few dense matrices on top of the timeseries
+        relmat_memory = (
+            (4 + len(args.measures))
+            * len(keep) ** 2
+            * np.dtype(args.dtype).itemsize
+        )
+        # the tangent space reference is accumulated per group during the
+        # imputation, the covariances are then projected in a second pass
+        tangent_spaces = {
+            get_group_key(p): TangentSpace()
+            for p in timeseries_paths
+            if "Tangent" in args.measures
         }
-        for p in tqdm(
-            timeseries_paths,
-            desc="Imputing NaN and recalculate functional connectomes",
-        ):
-            df = pd.read_csv(p, sep="\t", header=0, na_values="nan").loc[
-                :, keep
-            ]
-            row_means = df.mean(axis=1, skipna=True)  # global mean per TR
-            df_imputed = df.T.fillna(row_means).T
-            df_imputed.to_csv(p, index=False, sep="\t", na_rep="nan")
-            hp2b_log.debug(df_imputed.shape)
-            hp2b_log.debug(p)
-            # recreate the functional connectivity
-            for relmat_type in relmat_calculation:
-                dst = Path(
-                    str(p).replace("timeseries", f"meas-{relmat_type}_relmat")
+        executor.run(
+            impute_timeseries,
+            [
+                (
+                    (
+                        p,
+                        keep,
+                        args.compress,
+                        sparse,
+                        args.measures,
+                        tangent_spaces.get(get_group_key(p)),
+                        args.dtype,
+                    ),
+                    estimate_memory(p.stat().st_size, p.suffix == ".gz")
+                    + relmat_memory,
                 )
-                relmat = relmat_calculation[relmat_type].fit_transform(
-                    [df_imputed.values]
-                )[0]
-                df_relmat = pd.DataFrame(relmat, columns=df_imputed.columns)
-                df_relmat.to_csv(dst, index=False, sep="\t", na_rep="nan")
+                for p in timeseries_paths
+            ],
+            desc="Imputing NaN and recalculate functional connectomes",
+        )
+        log_peak_memory("imputation")
+        if tangent_spaces:
+            executor.run(
+                project_tangent,
+                [
+                    (
+                        (
+                            p,
+                            tangent_spaces[get_group_key(p)],
+                            args.compress,
+                            sparse,
+                            args.dtype,
+                        ),
+                        relmat_memory,
+                    )
+                    for p in timeseries_paths
+                ],
+                desc="Projecting connectomes to the tangent space",
+            )
+            log_peak_memory("tangent space projection")
+
+    executor.shutdown()
+    group_qc.write(output_dir, parquet=bool(args.parquet))
+    if args.parquet:
+        hp2b_log.info(f"Export timeseries to Parquet ({args.parquet} format).")
+        export_parquet(output_dir, layout=args.parquet, dtype=args.dtype)
+
+    if isinstance(halfpipe_dir, ArchivePath):
+        halfpipe_dir.archive.close()
+    hp2b_utils.add_checksums_provenance(output_dir)
+    manifest_path = checksums.stop_manifest()
+    hp2b_log.info(f"Checksums of the output files saved to {manifest_path}")
+    if failed_subjects:
+        raise ValueError(
+            f"{len(failed_subjects)} subject(s) could not be converted: "
+            f"{sorted(failed_subjects)}. See the errors above."
+        )
+
+
+def verify_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="halfpipe2bids-verify",
+        description=(
+            f"Check the files of a converted dataset against its "
+            f"{checksums.MANIFEST_NAME}."
+        ),
+    )
+    parser.add_argument(
+        "output_dir",
+        action="store",
+        type=Path,
+        help="The directory of the converted dataset.",
+    )
+    parser.add_argument(
+        "--n-workers",
+        help="Number of files checked in parallel. Default: number of CPUs.",
+        type=int,
+    )
+    return parser
+
+
+def verify_workflow(args: argparse.Namespace) -> None:
+    report = checksums.verify(args.output_dir, args.n_workers)
+    for name in report["unlisted"]:
+        hp2b_log.warning("Not in %s: %s", checksums.MANIFEST_NAME, name)
+    for status in ["missing", "modified"]:
+        for name in report[status]:
+            hp2b_log.error("%s: %s", status.capitalize(), name)
+    if report["missing"] or report["modified"]:
+        raise SystemExit(1)
+    hp2b_log.info(f"All files in {args.output_dir} match their checksum.")
+
+
+def verify_main(argv: None | Sequence[str] = None) -> None:
+    """Entry point of halfpipe2bids-verify."""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args = verify_parser().parse_args(argv)
+    try:
+        verify_workflow(args)
+    finally:
+        flush_logging()
 
 
 def main(argv: None | Sequence[str] = None) -> None:
     """Entry point."""
+    argv = sys.argv[1:] if argv is None else list(argv)
     parser = global_parser()
     args = parser.parse_args(argv)
-    workflow(args)
+    if args.measures and not args.impute_nan:
+        parser.error("--measures requires --impute-nan")
+    if args.watch and args.dry_run:
+        parser.error("--watch cannot be used with --dry-run")
+    if args.watch and is_archive(args.halfpipe_dir):
+        parser.error("--watch cannot be used with an archive")
+    if args.log_file:
+        set_log_file(args.log_file)
+    try:
+        workflow(args)
+    finally:
+        flush_logging()
+        if args.log_file:
+            set_log_file(None)
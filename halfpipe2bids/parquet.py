@@ -0,0 +1,148 @@
+"""Columnar export of the converted dataset to Parquet."""
+
+from __future__ import annotations
+
+import io
+import json
+import shutil
+
+import pandas as pd
+
+from halfpipe2bids.logger import hp2b_logger
+from halfpipe2bids.utils import get_bids_entities
+from halfpipe2bids.writers import write_bytes
+
+hp2b_log = hp2b_logger()
+
+parquet_layouts = ["long", "wide"]
+partition_entities = ["sub", "task"]
+
+
+def _check_pyarrow() -> None:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            "Parquet export requires pyarrow. Install it with "
+            "`pip install halfpipe2bids[parquet]`."
+        ) from e
+
+
+def timeseries_to_frame(path_timeseries, layout="long", dtype=None):
+    """
+    Load one converted timeseries and reshape it for the Parquet export.
+
+    Args:
+        path_timeseries (Path): Path to a BIDS timeseries TSV file, can be
+            gzip compressed.
+        layout (str): "long" gives one row per volume and parcel,
+            "wide" keeps one column per parcel. Default: "long"
+        dtype (str): Precision of the values, e.g. "float32".
+            Default: float64.
+
+    Returns:
+        pandas.DataFrame: Timeseries with the partition entities
+            ("sub", "task") and a "volume" column.
+    """
+    entities = get_bids_entities(path_timeseries)
+    df = pd.read_csv(
+        path_timeseries, sep="\t", header=0, na_values="nan", dtype=dtype
+    )
+    df.index.name = "volume"
+    if layout == "long":
+        df = df.melt(ignore_index=False, var_name="parcel", value_name="value")
+        df["parcel"] = df["parcel"].astype(int)
+    elif layout != "wide":
+        raise ValueError(
+            f"Unknown layout '{layout}', choose from {parquet_layouts}."
+        )
+    df = df.reset_index()
+    for entity in reversed(partition_entities):
+        df.insert(0, entity, entities[entity])
+    return df
+
+
+def timeseries_metadata_to_frame(meta_paths):
+    """
+    Collect the timeseries sidecars into one table with a row per run.
+
+    Nested values (e.g. denoising settings, confound lists) are stored as
+    JSON strings.
+
+    Args:
+        meta_paths (list[Path]): Paths to the timeseries JSON files.
+
+    Returns:
+        pandas.DataFrame: Metadata with one column per BIDS entity and
+            sidecar field.
+    """
+    rows = []
+    for p in meta_paths:
+        row = get_bids_entities(p)
+        with open(p, "r") as f:
+            meta = json.load(f)
+        for key, value in meta.items():
+            if isinstance(value, (list, dict)):
+                value = json.dumps(value)
+            row[key] = value
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def write_parquet(df, dst):
+    """Write a table to Parquet, recording its checksum."""
+    content = io.BytesIO()
+    df.to_parquet(content, index=False)
+    return write_bytes(dst, content.getvalue())
+
+
+def export_parquet(output_dir, layout="long", dtype=None):
+    """
+    Export the converted timeseries and their metadata to Parquet.
+
+    One dataset partitioned by subject and task is written per atlas and
+    denoising feature under ``<output_dir>/parquet``. Runs are appended one
+    at a time so the whole cohort is never loaded at once. The partition
+    entities are string columns of each file, e.g. a filter
+    ``("sub", "=", "01")`` keeps the leading zero. The sidecar
+    metadata of all runs is written to ``<output_dir>/parquet/runs.parquet``.
+
+    Args:
+        output_dir (Path): The BIDS output directory.
+        layout (str): "long" or "wide" timeseries layout. Default: "long"
+        dtype (str): Precision of the timeseries values, see
+            `timeseries_to_frame`.
+
+    Returns:
+        Path: The Parquet export directory.
+    """
+    _check_pyarrow()
+    parquet_dir = output_dir / "parquet"
+    if parquet_dir.exists():
+        shutil.rmtree(parquet_dir)
+    parquet_dir.mkdir(parents=True)
+
+    timeseries_paths = sorted(output_dir.glob("sub-*/**/*_timeseries.tsv*"))
+    for p in timeseries_paths:
+        entities = get_bids_entities(p)
+        # not hive partitioning (sub=01): readers would infer the labels
+        # from the directory names, as integers
+        dst = parquet_dir.joinpath(
+            f"seg-{entities['seg']}_desc-{entities['desc']}_timeseries",
+            *[f"{entity}-{entities[entity]}" for entity in partition_entities],
+        )
+        dst.mkdir(parents=True, exist_ok=True)
+        hp2b_log.debug("Exporting %s to %s", p, dst)
+        write_parquet(
+            timeseries_to_frame(p, layout, dtype),
+            dst / f"{p.name.split('.')[0]}.parquet",
+        )
+
+    meta_paths = sorted(output_dir.glob("sub-*/**/*_timeseries.json"))
+    write_parquet(
+        timeseries_metadata_to_frame(meta_paths), parquet_dir / "runs.parquet"
+    )
+    hp2b_log.info(
+        f"Exported {len(timeseries_paths)} timeseries to {parquet_dir}"
+    )
+    return parquet_dir
@@ -0,0 +1,286 @@
+"""Index the HALFpipe outputs and check them before the conversion."""
+
+from __future__ import annotations
+
+import json
+
+import pandas as pd
+
+from rich.console import Console
+from rich.table import Table
+
+from halfpipe2bids import utils as hp2b_utils
+
+# approximate size of gzip compressed TSVs relative to plain text
+COMPRESSION_RATIO = 0.5
+
+
+def index_halfpipe_outputs(
+    path_halfpipe_timeseries, output_dir, subject="sub-*"
+):
+    """
+    List the HALFpipe output files once, with their size and destination.
+
+    Args:
+        path_halfpipe_timeseries (Path | ArchivePath): HALFpipe derivatives
+            directory, on disk or in an archive.
+        output_dir (Path): The BIDS output directory.
+        subject (str): Subject directory to index. Default: all subjects.
+
+    Returns:
+        pandas.DataFrame: One row per file with columns "src", "size",
+            "dst" (None when the name cannot be converted) and "error".
+    """
+    rows = []
+    for src in sorted(path_halfpipe_timeseries.glob(f"{subject}/**/sub-*.*")):
+        try:
+            dst, error = hp2b_utils.get_bids_filename(src, output_dir), None
+        except KeyError as e:
+            dst, error = None, f"missing entity {e} in the file name"
+        rows.append(
+            {
+                "src": src,
+                "size": src.stat().st_size,
+                "dst": dst,
+                "error": error,
+            }
+        )
+    return pd.DataFrame(rows, columns=["src", "size", "dst", "error"])
+
+
+def _is_tsv(path):
+    return path.name.endswith((".tsv", ".tsv.gz"))
+
+
+def check_inputs(
+    index,
+    path_halfpipe_spec,
+    path_atlas_label,
+    path_atlas_nii,
+    path_fmriprep,
+    denoise_metadata=False,
+    impute_nan=False,
+    sparse=False,
+):
+    """
+    Find the problems that would make the conversion fail.
+
+    Args:
+        index (pandas.DataFrame): Output of `index_halfpipe_outputs`.
+        path_halfpipe_spec (Path): HALFpipe spec.json.
+        path_atlas_label (Path): Atlas label TSV file.
+        path_atlas_nii (Path): Atlas NIfTI file.
+        path_fmriprep (Path): fMRIPrep derivatives directory.
+        denoise_metadata (bool): Check the confound files and the atlas
+            are available.
+        impute_nan (bool): Check there are timeseries to impute, and the
+            atlas labels.
+        sparse (bool): Check the atlas labels are available.
+
+    Returns:
+        list[str]: Description of each problem found.
+    """
+    return check_index(
+        index, path_fmriprep, denoise_metadata, impute_nan
+    ) + check_dataset_files(
+        path_halfpipe_spec,
+        path_atlas_label,
+        path_atlas_nii,
+        denoise_metadata,
+        impute_nan,
+        sparse,
+    )
+
+
+def check_index(
+    index, path_fmriprep, denoise_metadata=False, impute_nan=False
+):
+    """
+    Find the problems in the HALFpipe output files, see `check_inputs`.
+
+    Returns:
+        list[str]: Description of each problem found.
+    """
+    errors = []
+    if index.empty:
+        errors.append("No HALFpipe output files found.")
+
+    for src, error in index.dropna(subset="error")[["src", "error"]].values:
+        errors.append(f"{src}: {error}")
+
+    converted = index.dropna(subset="dst")
+    for dst, group in converted.groupby("dst"):
+        if len(group) > 1:
+            errors.append(
+                f"{len(group)} files would be written to {dst}: "
+                f"{group['src'].tolist()}"
+            )
+
+    timeseries_json = [
+        dst
+        for dst in converted["dst"]
+        if dst.name.endswith("_timeseries.json")
+    ]
+    if denoise_metadata:
+        for dst in timeseries_json:
+            confound_file = hp2b_utils.get_confound_file(dst, path_fmriprep)
+            if not confound_file.is_file():
+                errors.append(f"{confound_file}: confound file not found")
+
+    if impute_nan and not any(
+        _is_tsv(dst) and "_timeseries" in dst.name for dst in converted["dst"]
+    ):
+        errors.append("No timeseries found for NaN imputation.")
+    return errors
+
+
+def check_dataset_files(
+    path_halfpipe_spec,
+    path_atlas_label,
+    path_atlas_nii,
+    denoise_metadata=False,
+    impute_nan=False,
+    sparse=False,
+):
+    """
+    Find the problems in the dataset-level inputs, see `check_inputs`.
+
+    The atlas files are only read by the steps after the renaming: the
+    labels by the NaN imputation, the denoising metadata and the sparse
+    connectomes, the image by the denoising metadata.
+
+    Returns:
+        list[str]: Description of each problem found.
+    """
+    required = [path_halfpipe_spec]
+    if denoise_metadata or impute_nan or sparse:
+        required.append(path_atlas_label)
+    if denoise_metadata:
+        required.append(path_atlas_nii)
+    errors = []
+    for path in required:
+        if not path.is_file():
+            errors.append(f"{path}: file not found")
+
+    if path_halfpipe_spec.is_file():
+        with path_halfpipe_spec.open("r") as f:
+            halfpipe_spec = json.load(f)
+        atlas_entries = [
+            entry
+            for entry in halfpipe_spec.get("files", [])
+            if entry.get("suffix", False)
+        ]
+        if not atlas_entries:
+            errors.append(f"{path_halfpipe_spec}: no atlas in 'files'")
+        elif "desc" not in atlas_entries[-1].get("tags", {}):
+            errors.append(f"{path_halfpipe_spec}: atlas has no 'desc' tag")
+    return errors
+
+
+def plan_conversion(index, path_fmriprep, args):
+    """
+    Estimate the files and bytes read and written at each stage.
+
+    Args:
+        index (pandas.DataFrame): Output of `index_halfpipe_outputs`.
+        path_fmriprep (Path): fMRIPrep derivatives directory.
+        args (argparse.Namespace): The command line arguments.
+
+    Returns:
+        pandas.DataFrame: One row per stage with the number of files and
+            the estimated bytes read and written.
+    """
+    converted = index.dropna(subset="dst")
+    is_tsv = converted["dst"].map(_is_tsv)
+    tsv_ratio = COMPRESSION_RATIO if args.compress else 1.0
+    out_size = converted["size"].where(~is_tsv, converted["size"] * tsv_ratio)
+    is_timeseries = converted["dst"].map(
+        lambda p: p.name.split(".")[0].endswith("_timeseries")
+    )
+    timeseries = converted[is_timeseries & is_tsv]
+    timeseries_json = converted[is_timeseries & ~is_tsv]
+    relmat = converted[converted["dst"].map(lambda p: "_relmat" in p.name)]
+
+    plan = [
+        {
+            "stage": "rename",
+            "files": len(converted),
+            "bytes_read": converted["size"].sum(),
+            "bytes_written": out_size.sum(),
+        }
+    ]
+    if args.denoise_metadata:
+        confound_files = [
+            hp2b_utils.get_confound_file(p, path_fmriprep)
+            for p in timeseries_json["dst"]
+        ]
+        confounds_size = sum(
+            p.stat().st_size for p in confound_files if p.is_file()
+        )
+        plan.append(
+            {
+                "stage": "denoise-metadata",
+                "files": len(timeseries_json),
+                "bytes_read": timeseries_json["size"].sum() + confounds_size,
+                "bytes_written": timeseries_json["size"].sum(),
+            }
+        )
+    if args.impute_nan:
+        # the timeseries are read once to find the bad parcels, then again
+        # to impute them and recompute the connectomes
+        plan.append(
+            {
+                "stage": "impute-nan",
+                "files": len(timeseries),
+                "bytes_read": 2 * timeseries["size"].sum(),
+                "bytes_written": (
+                    timeseries["size"].sum() + relmat["size"].sum()
+                )
+                * tsv_ratio,
+            }
+        )
+    if args.parquet:
+        plan.append(
+            {
+                "stage": "parquet",
+                "files": len(timeseries) + len(timeseries_json),
+                "bytes_read": timeseries["size"].sum()
+                + timeseries_json["size"].sum(),
+                "bytes_written": timeseries["size"].sum() * COMPRESSION_RATIO,
+            }
+        )
+    plan = pd.DataFrame(plan).set_index("stage")
+    plan.loc["total"] = plan.sum()
+    return plan.astype(int)
+
+
+def _format_bytes(n_bytes):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if n_bytes < 1000:
+            return f"{n_bytes:.1f} {unit}"
+        n_bytes /= 1000
+    return f"{n_bytes:.1f} TB"
+
+
+def print_plan(plan, errors):
+    """Print the conversion plan and the problems found."""
+    table = Table(title="Conversion plan (sizes are estimates)")
+    table.add_column("Stage")
+    table.add_column("Files", justify="right")
+    table.add_column("Read", justify="right")
+    table.add_column("Written", justify="right")
+    for stage, row in plan.iterrows():
+        table.add_row(
+            stage,
+            str(row["files"]),
+            _format_bytes(row["bytes_read"]),
+            _format_bytes(row["bytes_written"]),
+        )
+    console = Console()
+    console.print(table)
+    if errors:
+        console.print(f"[red]{len(errors)} problem(s) found:")
+        for error in errors:
+            console.print(f"  - {error}", markup=False)
+    else:
+        console.print("[green]No problem found.")
@@ -0,0 +1,135 @@
+"""Group-level quality control table, collected during the conversion."""
+
+from __future__ import annotations
+
+import threading
+
+import pandas as pd
+
+from halfpipe2bids.logger import hp2b_logger
+from halfpipe2bids.parquet import write_parquet
+from halfpipe2bids.utils import get_bids_entities
+from halfpipe2bids.writers import write_json, write_tsv
+
+hp2b_log = hp2b_logger()
+
+QC_NAME = "group_qc"
+qc_keys = ["sub", "task", "seg", "desc"]
+qc_columns = {
+    "NumberOfVolumes": "Number of volumes of the timeseries.",
+    "ProportionMissingValues": "Proportion of NaN values in the timeseries.",
+    "NumberOfMissingParcels": "Number of parcels without signal (all NaN).",
+    "MissingParcels": "Indices of the parcels without signal, comma "
+    "separated.",
+    "SamplingFrequency": "Sampling frequency of the timeseries in Hz.",
+    "NumberOfConfoundRegressors": "Number of fMRIPrep confounds regressed "
+    "out.",
+    "NumberOfVolumesDiscardedByMotionScrubbing": "Number of motion outlier "
+    "volumes in the fMRIPrep confounds.",
+    "MeanFramewiseDisplacement": "Mean framewise displacement in mm.",
+    "MaxFramewiseDisplacement": "Maximum framewise displacement in mm.",
+}
+
+
+class GroupQC:
+    """
+    Quality control values of each run, collected while the workflow
+    computes them so the outputs are not read again.
+
+    A run is identified by the sub, task, seg and desc entities of its
+    files. `add` is thread safe.
+    """
+
+    def __init__(self):
+        self.runs = {}
+        self._lock = threading.Lock()
+
+    def add(self, path, values):
+        """Add values to the run of a converted file."""
+        entities = get_bids_entities(path)
+        key = tuple(entities.get(entity, "n/a") for entity in qc_keys)
+        with self._lock:
+            self.runs.setdefault(key, {}).update(values)
+
+    def add_nan_coverage(self, path_timeseries, missing):
+        """
+        Add the NaN coverage of a timeseries.
+
+        Args:
+            path_timeseries (Path): The converted timeseries.
+            missing (pandas.DataFrame): Volumes x parcels, True for NaN.
+        """
+        missing_parcels = missing.columns[missing.all(axis=0)]
+        self.add(
+            path_timeseries,
+            {
+                "NumberOfVolumes": missing.shape[0],
+                "ProportionMissingValues": missing.to_numpy().mean(),
+                "NumberOfMissingParcels": len(missing_parcels),
+                "MissingParcels": ",".join(map(str, missing_parcels)),
+            },
+        )
+
+    def add_denoise_metadata(self, path_timeseries_json, extra_meta):
+        """
+        Add the denoising metadata of a run.
+
+        Args:
+            path_timeseries_json (Path): The timeseries sidecar.
+            extra_meta (dict): Output of `populate_timeseries_json`.
+        """
+        values = {
+            key: extra_meta[key]
+            for key in [
+                "SamplingFrequency",
+                "NumberOfVolumesDiscardedByMotionScrubbing",
+                "MeanFramewiseDisplacement",
+                "MaxFramewiseDisplacement",
+            ]
+        }
+        values["NumberOfConfoundRegressors"] = len(
+            extra_meta["ConfoundRegressors"]
+        )
+        self.add(path_timeseries_json, values)
+
+    def to_frame(self):
+        """
+        Returns:
+            pandas.DataFrame: One row per run, sorted by entities.
+        """
+        df = pd.DataFrame(
+            [
+                dict(zip(qc_keys, key), **values)
+                for key, values in sorted(self.runs.items())
+            ]
+        )
+        return df.reindex(
+            columns=qc_keys + [c for c in qc_columns if c in df.columns]
+        )
+
+    def write(self, output_dir, parquet=False):
+        """
+        Write the table and its column descriptions at the dataset root.
+
+        Args:
+            output_dir (Path): The BIDS output directory.
+            parquet (bool): Also write the table to Parquet.
+
+        Returns:
+            Path: Path to the TSV file.
+        """
+        df = self.to_frame()
+        dst = output_dir / f"{QC_NAME}.tsv"
+        write_tsv(df, dst, index=False)
+        write_json(
+            {
+                column: {"Description": qc_columns[column]}
+                for column in df.columns
+                if column in qc_columns
+            },
+            output_dir / f"{QC_NAME}.json",
+        )
+        if parquet:
+            write_parquet(df, output_dir / f"{QC_NAME}.parquet")
+        hp2b_log.info(f"Group QC of {len(df)} runs saved to {dst}")
+        return dst
@@ -0,0 +1,181 @@
+"""Run per-file tasks in parallel within a memory budget."""
+
+from __future__ import annotations
+
+import os
+import re
+import sys
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from tqdm import tqdm
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Estimated peak memory of a task relative to the size of the text files it
+# processes: parsed values, the formatted output and its encoded bytes.
+MEMORY_FACTOR = 3
+
+memory_units = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_memory_size(value):
+    """
+    Convert a memory size such as "512M" or "16G" to bytes.
+
+    Args:
+        value (str): Number of bytes with an optional K, M, G or T unit.
+
+    Returns:
+        int: Number of bytes.
+
+    Raises:
+        ValueError: If the value cannot be parsed.
+
+    >>> parse_memory_size("1.5K")
+    1536
+    """
+    match = re.fullmatch(r"\s*([0-9.]+)\s*([KMGT]?)I?B?\s*", value.upper())
+    if match is None:
+        raise ValueError(f"Invalid memory size: '{value}'")
+    number, unit = match.groups()
+    return int(float(number) * memory_units[unit])
+
+
+def estimate_memory(size, compressed=False):
+    """
+    Estimate the peak memory needed to process a TSV file.
+
+    Args:
+        size (int): File size in bytes.
+        compressed (bool): The file is gzip compressed.
+
+    Returns:
+        int: Estimated memory in bytes.
+    """
+    if compressed:
+        size *= 2
+    return int(MEMORY_FACTOR * size)
+
+
+def peak_rss():
+    """
+    Peak resident set size of the process.
+
+    Returns:
+        int | None: Peak memory in bytes, None if not available.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryBudgetExecutor:
+    """
+    Thread pool that only starts a task when its estimated memory fits in
+    the budget.
+
+    The number of tasks running at the same time changes with their cost:
+    many small files run together, while a large file waits for memory to
+    be released. A task larger than the whole budget runs on its own.
+
+    Args:
+        mem_budget (int | None): Memory budget in bytes. None for no limit.
+        max_workers (int | None): Maximum number of concurrent tasks.
+            Default: number of CPUs.
+    """
+
+    def __init__(self, mem_budget=None, max_workers=None):
+        self.mem_budget = mem_budget
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.in_use = 0
+        self.running = 0
+        self.max_running = 0
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="hp2b"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def _fits(self, cost):
+        if self.running >= self.max_workers:
+            return False
+        if self.mem_budget is None or self.running == 0:
+            return True
+        return self.in_use + cost <= self.mem_budget
+
+    def _release(self, cost):
+        with self._condition:
+            self.in_use -= cost
+            self.running -= 1
+            self._condition.notify_all()
+
+    def submit(self, fn, *args, cost=0, **kwargs):
+        """
+        Schedule `fn(*args, **kwargs)`, waiting until `cost` bytes fit in
+        the budget.
+
+        Returns:
+            concurrent.futures.Future
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._fits(cost))
+            self.in_use += cost
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release(cost)
+            raise
+        future.add_done_callback(lambda _: self._release(cost))
+        return future
+
+    def run(self, fn, tasks, desc=None, total=None):
+        """
+        Run `fn` on each task and wait for all of them to finish.
+
+        Args:
+            fn (Callable): Function to run.
+            tasks (Iterable[tuple[tuple, int]]): Arguments of each call and
+                its estimated memory in bytes. With a generator, each task
+                is only created once the previous one is scheduled.
+            desc (str): Progress bar description.
+            total (int): Number of tasks, for the progress bar. Default:
+                `len(tasks)`.
+
+        Returns:
+            list: Return value of each call, in the order of `tasks`.
+        """
+        futures = []
+        failed = threading.Event()
+
+        def _done(future):
+            progress.update()
+            if future.exception() is not None:
+                failed.set()
+
+        if total is None:
+            total = len(tasks)
+        with tqdm(total=total, desc=desc) as progress:
+            for args, cost in tasks:
+                if failed.is_set():  # stop scheduling, the error is raised
+                    break
+                future = self.submit(fn, *args, cost=cost)
+                future.add_done_callback(_done)
+                futures.append(future)
+            return [future.result() for future in futures]
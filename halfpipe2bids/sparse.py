@@ -0,0 +1,135 @@
+"""Sparse connectomes keeping only the strongest edges."""
+
+from __future__ import annotations
+
+import io
+
+import numpy as np
+
+from scipy import sparse
+
+from halfpipe2bids.logger import hp2b_logger
+from halfpipe2bids.utils import meas_meta
+from halfpipe2bids.writers import write_bytes, write_json
+
+hp2b_log = hp2b_logger()
+
+sparse_methods = {
+    "top-k": "The k strongest absolute weights of each node",
+    "threshold": "Absolute weights at or above the threshold",
+    "proportion": "The given proportion of strongest absolute weights",
+}
+
+
+def sparsify(mat, method, value):
+    """
+    Keep the strongest edges of a connectome.
+
+    The diagonal is dropped and NaN are treated as missing edges. The
+    result is symmetric: with "top-k", an edge is kept when it is among
+    the k strongest of either of its nodes.
+
+    Args:
+        mat (numpy.ndarray): Dense square connectome.
+        method (str): "top-k", "threshold" or "proportion".
+        value (float): Number of edges per node, absolute threshold, or
+            proportion of edges to keep.
+
+    Returns:
+        numpy.ndarray: Boolean mask of the edges to keep.
+    """
+    weights = np.abs(np.nan_to_num(mat, nan=0.0))
+    np.fill_diagonal(weights, 0)
+    if method == "top-k":
+        k = min(int(value), weights.shape[0] - 1)
+        if k <= 0:
+            return np.zeros(weights.shape, dtype=bool)
+        top_k = np.argpartition(-weights, k - 1, axis=1)[:, :k]
+        mask = np.zeros(weights.shape, dtype=bool)
+        np.put_along_axis(mask, top_k, True, axis=1)
+        mask |= mask.T
+    elif method == "threshold":
+        mask = weights >= value
+    elif method == "proportion":
+        edges = weights[np.triu_indices_from(weights, k=1)]
+        n_keep = int(round(value * edges.size))
+        if n_keep == 0:
+            return np.zeros(weights.shape, dtype=bool)
+        mask = weights >= np.partition(edges, -n_keep)[-n_keep]
+    else:
+        raise ValueError(
+            f"Unknown method '{method}', choose from {list(sparse_methods)}."
+        )
+    mask &= weights > 0
+    np.fill_diagonal(mask, False)
+    return mask
+
+
+def get_sparse_filename(dst):
+    """
+    Path of the sparse connectome associated with a dense one.
+
+    >>> from pathlib import Path
+    >>> get_sparse_filename(Path("sub-1_meas-covariance_relmat.tsv.gz")).name
+    'sub-1_meas-covarianceSparse_relmat.npz'
+    """
+    name = dst.name.split(".")[0].replace("_relmat", "")
+    return dst.with_name(f"{name}Sparse_relmat.npz")
+
+
+def write_sparse_relmat(df_relmat, dst, method, value, n_parcels):
+    """
+    Save the strongest edges of a connectome in scipy CSR format (.npz).
+
+    The rows and columns are indexed by parcel index - 1, so parcels
+    removed from the dense connectome simply have no edge, and all the
+    connectomes of an atlas have the same shape.
+
+    Args:
+        df_relmat (pandas.DataFrame): Dense connectome with the parcel
+            indices as columns.
+        dst (Path): Path of the dense connectome.
+        method (str): See `sparsify`.
+        value (float): See `sparsify`.
+        n_parcels (int): Largest parcel index of the atlas.
+
+    Returns:
+        Path: The path of the sparse connectome.
+    """
+    values = df_relmat.to_numpy()
+    rows, cols = np.nonzero(sparsify(values, method, value))
+    parcels = df_relmat.columns.astype(int).to_numpy() - 1
+    relmat = sparse.csr_array(
+        (values[rows, cols], (parcels[rows], parcels[cols])),
+        shape=(n_parcels, n_parcels),
+    )
+    content = io.BytesIO()
+    sparse.save_npz(content, relmat)
+    return write_bytes(get_sparse_filename(dst), content.getvalue())
+
+
+def create_sparse_metadata_json(
+    output_dir, method, value, measures=None
+) -> None:
+    """
+    Create the dataset-level metadata of the sparse connectomes.
+
+    Args:
+        output_dir (Path): The BIDS output directory.
+        method (str): See `sparsify`.
+        value (float): See `sparsify`.
+        measures (list[str]): Measures to describe. Default: all measures
+            in `meas_meta`.
+    """
+    for meas in measures or meas_meta:
+        meta = meas_meta[meas].copy()
+        meta["StorageFormat"] = "Sparse"
+        meta["SparseFormat"] = "scipy.sparse CSR array (.npz)"
+        meta["Sparsification"] = {
+            "Method": method,
+            "Value": value,
+            "Description": sparse_methods[method],
+        }
+        meas_path = output_dir / f"meas-{meas}Sparse_relmat.json"
+        write_json(meta, meas_path)
+        hp2b_log.info(f"Exported sparse {meas} metadata to {meas_path}")
@@ -0,0 +1,94 @@
+"""Shared fixtures: the test dataset and fake HALFpipe and BIDS outputs."""
+
+import json
+import shutil
+
+from importlib import resources
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def halfpipe_dataset():
+    """The HALFpipe test dataset of 10 subjects."""
+    return (
+        resources.files("halfpipe2bids")
+        / "tests/data/dataset-ds000030_halfpipe1.2.3dev"
+    )
+
+
+@pytest.fixture
+def halfpipe_subject_dir(tmp_path, halfpipe_dataset):
+    """Copy of the test dataset with one subject, sub-10159."""
+    halfpipe_dir = tmp_path / "halfpipe"
+    shutil.copytree(halfpipe_dataset / "atlas", halfpipe_dir / "atlas")
+    shutil.copy(halfpipe_dataset / "spec.json", halfpipe_dir / "spec.json")
+    for derivatives in ["halfpipe", "fmriprep"]:
+        shutil.copytree(
+            halfpipe_dataset / "derivatives" / derivatives / "sub-10159",
+            halfpipe_dir / "derivatives" / derivatives / "sub-10159",
+        )
+    return halfpipe_dir
+
+
+@pytest.fixture
+def write_halfpipe_timeseries():
+    """
+    Factory of HALFpipe timeseries, and their sidecar, in the layout of
+    derivatives/halfpipe.
+    """
+
+    def _write(
+        halfpipe_dir,
+        subject="01",
+        feature="corrMatrix1",
+        atlas="schaefer400",
+        content="1\t2\n",
+        sidecar=True,
+    ):
+        func = halfpipe_dir / f"sub-{subject}" / "func" / "task-rest"
+        func.mkdir(parents=True, exist_ok=True)
+        base = f"sub-{subject}_task-rest_feature-{feature}"
+        if atlas is not None:
+            base += f"_atlas-{atlas}"
+        (func / f"{base}_timeseries.tsv").write_text(content)
+        if sidecar:
+            (func / f"{base}_timeseries.json").write_text("{}")
+        return func / f"{base}_timeseries.tsv"
+
+    return _write
+
+
+@pytest.fixture
+def write_bids_timeseries():
+    """
+    Factory of converted timeseries of random values, in the layout of the
+    BIDS output.
+    """
+
+    def _write(
+        output_dir,
+        sub="01",
+        feature="corrMatrix1",
+        n_volumes=5,
+        n_parcels=3,
+        missing_parcels=(),
+        sidecar=None,
+    ):
+        func = output_dir / f"sub-{sub}" / "func"
+        func.mkdir(parents=True, exist_ok=True)
+        base = f"sub-{sub}_task-rest_seg-schaefer400_desc-{feature}_timeseries"
+        ts = pd.DataFrame(
+            np.random.default_rng(0).normal(size=(n_volumes, n_parcels)),
+            columns=[str(i) for i in range(1, n_parcels + 1)],
+        )
+        ts[list(missing_parcels)] = np.nan
+        ts.to_csv(func / f"{base}.tsv", index=False, sep="\t", na_rep="nan")
+        if sidecar is not None:
+            with open(func / f"{base}.json", "w") as f:
+                json.dump(sidecar, f)
+        return func / f"{base}.tsv"
+
+    return _write
@@ -0,0 +1,102 @@
+import tarfile
+import zipfile
+
+import pytest
+
+from halfpipe2bids.archive import (
+    HalfpipeArchive,
+    open_halfpipe_dir,
+    read_members,
+    read_tsv,
+)
+from halfpipe2bids.main import main
+
+
+@pytest.fixture
+def halfpipe_dir(tmp_path, write_halfpipe_timeseries):
+    halfpipe_dir = tmp_path / "halfpipe"
+    for feature in ["corrMatrix1", "corrMatrix2"]:
+        write_halfpipe_timeseries(
+            halfpipe_dir / "derivatives/halfpipe",
+            feature=feature,
+            content="1\t2\n3\tnan\n",
+        )
+    (halfpipe_dir / "spec.json").write_text("{}")
+    return halfpipe_dir
+
+
+def _archive(src, dst):
+    if dst.name.endswith(".zip"):
+        with zipfile.ZipFile(dst, "w") as f:
+            for p in sorted(src.rglob("*")):
+                f.write(p, p.relative_to(src.parent))
+    else:
+        with tarfile.open(dst, "w:gz" if dst.suffix == ".gz" else "w") as f:
+            f.add(src, src.name)
+    return dst
+
+
+@pytest.mark.parametrize("name", ["halfpipe.tar", "halfpipe.tar.gz", "h.zip"])
+def test_open_halfpipe_dir(tmp_path, halfpipe_dir, name):
+    halfpipe_dir = open_halfpipe_dir(_archive(halfpipe_dir, tmp_path / name))
+    # the HALFpipe directory is found inside the archive
+    assert str(halfpipe_dir) == f"{tmp_path / name}/halfpipe"
+    assert (halfpipe_dir / "spec.json").is_file()
+    assert (halfpipe_dir / "derivatives").is_dir()
+    assert not (halfpipe_dir / "atlas").exists()
+
+    timeseries = sorted(
+        (halfpipe_dir / "derivatives/halfpipe").glob("sub-*/**/sub-*.*")
+    )
+    assert [p.name for p in timeseries] == [
+        "sub-01_task-rest_feature-corrMatrix1_atlas-schaefer400_"
+        "timeseries.json",
+        "sub-01_task-rest_feature-corrMatrix1_atlas-schaefer400_"
+        "timeseries.tsv",
+        "sub-01_task-rest_feature-corrMatrix2_atlas-schaefer400_"
+        "timeseries.json",
+        "sub-01_task-rest_feature-corrMatrix2_atlas-schaefer400_"
+        "timeseries.tsv",
+    ]
+    assert timeseries[1].stat().st_size == 10
+    with timeseries[0].open() as f:
+        assert f.read() == "{}"
+    df = read_tsv(timeseries[1], header=None, na_values="nan")
+    assert df.shape == (2, 2) and df.isna().sum().sum() == 1
+
+    contents = dict(read_members(timeseries))
+    assert contents[timeseries[1]] == b"1\t2\n3\tnan\n"
+
+
+def test_archive_root(tmp_path, halfpipe_dir):
+    with tarfile.open(tmp_path / "flat.tar", "w") as f:
+        f.add(halfpipe_dir, ".")
+    archive = HalfpipeArchive(tmp_path / "flat.tar")
+    assert str(archive.root) == str(tmp_path / "flat.tar")
+    assert (archive.root / "spec.json").is_file()
+    archive.close()
+
+
+def test_archive_cli(tmp_path, halfpipe_subject_dir):
+    halfpipe_dir = halfpipe_subject_dir
+    archive = _archive(halfpipe_dir, tmp_path / "halfpipe.tar.gz")
+    for src, dst in [(halfpipe_dir, "from_dir"), (archive, "from_archive")]:
+        main([str(src), str(tmp_path / dst), "group", "--denoise-metadata"])
+
+    expected = sorted(
+        p.relative_to(tmp_path / "from_dir")
+        for p in (tmp_path / "from_dir").rglob("sub-*/**/*.*")
+    )
+    assert len(expected) == 20
+    for p in expected:
+        assert (tmp_path / "from_archive" / p).read_bytes() == (
+            tmp_path / "from_dir" / p
+        ).read_bytes()
+
+
+def test_archive_watch(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        main(
+            [str(tmp_path / "halfpipe.zip"), str(tmp_path), "group", "--watch"]
+        )
+    assert "--watch cannot be used with an archive" in capsys.readouterr().err
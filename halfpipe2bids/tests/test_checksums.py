@@ -0,0 +1,95 @@
+import hashlib
+
+import pandas as pd
+import pytest
+
+from halfpipe2bids import checksums, utils
+from halfpipe2bids.checksums import (
+    ChecksumManifest,
+    start_manifest,
+    stop_manifest,
+    verify,
+)
+from halfpipe2bids.main import main, verify_main
+from halfpipe2bids.writers import copy_file, write_json, write_tsv
+
+
+def _write_outputs(output_dir):
+    start_manifest(output_dir)
+    write_json({"Name": "test"}, output_dir / "dataset_description.json")
+    func = output_dir / "sub-01" / "func"
+    func.mkdir(parents=True)
+    write_tsv(pd.DataFrame({"1": [1.0, 2.0]}), func / "a_timeseries.tsv")
+    copy_file(output_dir / "dataset_description.json", func / "a.json")
+    # overwritten files keep the checksum of their last version
+    write_json({"Name": "final"}, output_dir / "dataset_description.json")
+    # replaced by a compressed version
+    write_tsv(pd.DataFrame({"1": [1.0, 2.0]}), func / "a_timeseries.tsv", True)
+    return stop_manifest()
+
+
+def test_manifest(tmp_path):
+    manifest_path = _write_outputs(tmp_path)
+    manifest = ChecksumManifest.load(tmp_path)
+    assert list(manifest.checksums) == [
+        "dataset_description.json",
+        "sub-01/func/a.json",
+        "sub-01/func/a_timeseries.tsv.gz",
+    ]
+    for name, digest in manifest.checksums.items():
+        content = (tmp_path / name).read_bytes()
+        assert hashlib.sha256(content).hexdigest() == digest
+    assert manifest_path.read_text().startswith(
+        f"{manifest.checksums['dataset_description.json']}  "
+        "dataset_description.json\n"
+    )
+
+    # a new run in the same directory keeps the former checksums
+    start_manifest(tmp_path)
+    write_json({}, tmp_path / "extra.json")
+    stop_manifest()
+    assert len(ChecksumManifest.load(tmp_path).checksums) == 4
+
+
+def test_verify(tmp_path):
+    _write_outputs(tmp_path)
+    assert verify(tmp_path) == {"missing": [], "modified": [], "unlisted": []}
+    verify_main([str(tmp_path)])
+
+    (tmp_path / "sub-01/func/a.json").write_text("{}")
+    (tmp_path / "dataset_description.json").unlink()
+    (tmp_path / "notes.txt").write_text("")
+    assert verify(tmp_path, n_workers=2) == {
+        "missing": ["dataset_description.json"],
+        "modified": ["sub-01/func/a.json"],
+        "unlisted": ["notes.txt"],
+    }
+    with pytest.raises(SystemExit):
+        verify_main([str(tmp_path)])
+
+    with pytest.raises(FileNotFoundError):
+        verify(tmp_path / "sub-01")
+
+
+def test_manifest_stopped_on_failure(
+    tmp_path, halfpipe_subject_dir, monkeypatch
+):
+    def _fail(*args, **kwargs):
+        raise RuntimeError("stage failed")
+
+    monkeypatch.setattr(utils, "create_dataset_metadata_json", _fail)
+    with pytest.raises(RuntimeError):
+        main([str(halfpipe_subject_dir), str(tmp_path / "bids"), "group"])
+    # the files converted before the failure are in the manifest
+    assert checksums._active_manifest is None
+    manifest = ChecksumManifest.load(tmp_path / "bids")
+    assert any(name.endswith("_timeseries.tsv") for name in manifest.checksums)
+
+
+def test_convert_directory_named_verify(
+    tmp_path, halfpipe_subject_dir, monkeypatch
+):
+    halfpipe_subject_dir.rename(tmp_path / "verify")
+    monkeypatch.chdir(tmp_path)
+    main(["verify", "bids", "group"])
+    verify_main(["bids"])
@@ -6,10 +6,18 @@ from importlib import resources
 import json
 import pytest
 
+import numpy as np
 import pandas as pd
 
+from scipy import sparse
+
 from halfpipe2bids import __version__
-from halfpipe2bids.main import main
+from halfpipe2bids.main import (
+    convert_file,
+    impute_timeseries,
+    main,
+    verify_main,
+)
 
 
 def test_version(capsys):
@@ -32,6 +40,52 @@ def test_help(capsys):
     )
 
 
+def test_impute_timeseries_float32(tmp_path):
+    rng = np.random.default_rng(0)
+    timeseries = pd.DataFrame(
+        rng.normal(size=(120, 30)), columns=[str(i) for i in range(1, 31)]
+    )
+    timeseries.iloc[::7, 3] = np.nan
+    measures = ["PartialCorrelation", "FisherZ"]
+    relmats = {}
+    for dtype in ["float64", "float32"]:
+        path = tmp_path / dtype / "sub-1_task-rest_timeseries.tsv"
+        path.parent.mkdir()
+        timeseries.to_csv(path, sep="\t", index=False, na_rep="nan")
+        impute_timeseries(
+            path, list(timeseries.columns), measures=measures, dtype=dtype
+        )
+        relmats[dtype] = {
+            measure: pd.read_csv(
+                tmp_path
+                / dtype
+                / f"sub-1_task-rest_meas-{measure}_relmat.tsv",
+                sep="\t",
+            ).values
+            for measure in ["covariance", "PearsonCorrelation"] + measures
+        }
+    for measure, reference in relmats["float64"].items():
+        np.testing.assert_allclose(
+            relmats["float32"][measure], reference, rtol=1e-4, atol=1e-5
+        )
+
+
+def test_convert_file_float32(tmp_path, write_halfpipe_timeseries):
+    src = write_halfpipe_timeseries(
+        tmp_path / "halfpipe",
+        feature="corrMatrix1",
+        content="1\t8887.8768237074\n8887.8768237074\t1\n",
+    )
+    dst = tmp_path / "sub-01_task-rest_meas-PearsonCorrelation_relmat.tsv"
+    convert_file(src, dst, sparse=("top-k", 1, 2), dtype="float32")
+    # the renamed file keeps the precision of HALFpipe
+    assert "8887.8768237074" in dst.read_text()
+    sparse_file = dst.with_name(
+        "sub-01_task-rest_meas-PearsonCorrelationSparse_relmat.npz"
+    )
+    assert sparse.load_npz(sparse_file).dtype == np.float32
+
+
 @pytest.mark.smoke
 def test_smoke(tmp_path, caplog):
     halfpipe_dir = (
@@ -64,11 +118,17 @@ def test_smoke(tmp_path, caplog):
         # however, when no flags are passed, this is just copying the original
         # file, hence ,mistake remains.
         assert content.get("SamplingFrequency") == 2
+    # the NaN coverage of every run is collected during the conversion
+    group_qc = pd.read_csv(output_dir / "group_qc.tsv", sep="\t")
+    assert len(group_qc) == 50
+    assert group_qc["NumberOfMissingParcels"].max() > 0
 
     # TODO: when the --impute-nans option is added, create a test for
     # the relmat with NaNs replaced by grand mean
 
     main(cmd + ["--denoise-meta"])
+    group_qc = pd.read_csv(output_dir / "group_qc.tsv", sep="\t")
+    assert group_qc["MeanFramewiseDisplacement"].notna().all()
     assert json_file.exists()
     with open(json_file, "r") as f:
         content = json.load(f)
@@ -89,3 +149,40 @@ def test_smoke(tmp_path, caplog):
     relmat = pd.read_csv(relmat_file, sep="\t")
     # This is the number of ROI (columns) I got from the supposedly original file
     assert relmat.shape[1] == 417  # ROI with too many subjects missing removed
+
+    # every output file has a checksum
+    with open(output_dir / "dataset_description.json", "r") as f:
+        description = json.load(f)
+    assert description["GeneratedBy"][0]["Checksums"]["File"] == "SHA256SUMS"
+    verify_main([str(output_dir)])
+
+    # optional outputs, in single precision
+    options_dir = tmp_path / "output_options"
+    main(
+        [str(halfpipe_dir), str(options_dir), "group", "--impute-nan"]
+        + ["--parquet", "--sparse-top-k", "10", "--dtype", "float32"]
+        + ["--measures", "PartialCorrelation", "FisherZ", "Tangent"]
+    )
+    options_folder = options_dir / "sub-10159/func"
+    np.testing.assert_allclose(
+        pd.read_csv(options_folder / relmat_file.name, sep="\t").values,
+        relmat.values,
+        atol=1e-4,
+    )
+    assert (options_dir / "parquet" / "runs.parquet").exists()
+    assert (options_dir / "group_qc.parquet").exists()
+    sparse_file = options_folder / (
+        ts_base + "_meas-PearsonCorrelationSparse_relmat.npz"
+    )
+    assert sparse_file.exists()
+    sparse_relmat = sparse.load_npz(sparse_file)
+    assert sparse_relmat.dtype == np.float32
+    # indexed by the parcels of the atlas, including the removed ones
+    assert sparse_relmat.shape == (434, 434)
+    for meas in ["PartialCorrelation", "FisherZ", "Tangent"]:
+        relmat = pd.read_csv(
+            options_folder / (ts_base + f"_meas-{meas}_relmat.tsv"), sep="\t"
+        )
+        assert relmat.shape == (417, 417)
+        assert (options_dir / f"meas-{meas}_relmat.json").exists()
+    verify_main([str(options_dir)])
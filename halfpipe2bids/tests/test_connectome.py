@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from nilearn.connectome import ConnectivityMeasure
+from scipy import linalg
+
+from halfpipe2bids.connectome import TangentSpace, compute_connectomes
+
+
+def _timeseries(seed, n_volumes=100, n_parcels=6):
+    return np.random.default_rng(seed).normal(size=(n_volumes, n_parcels))
+
+
+def test_compute_connectomes():
+    ts = _timeseries(0)
+    connectomes = compute_connectomes(ts, ["PartialCorrelation", "FisherZ"])
+    assert list(connectomes) == [
+        "covariance",
+        "PearsonCorrelation",
+        "PartialCorrelation",
+        "FisherZ",
+    ]
+    partial = ConnectivityMeasure(kind="partial correlation").fit_transform(
+        [ts]
+    )[0]
+    np.testing.assert_allclose(connectomes["PartialCorrelation"], partial)
+    np.testing.assert_allclose(
+        np.tanh(connectomes["FisherZ"])[np.triu_indices(6, k=1)],
+        connectomes["PearsonCorrelation"][np.triu_indices(6, k=1)],
+    )
+    assert list(compute_connectomes(ts)) == [
+        "covariance",
+        "PearsonCorrelation",
+    ]
+
+
+def test_tangent_space():
+    covariances = [
+        compute_connectomes(_timeseries(seed))["covariance"]
+        for seed in range(8)
+    ]
+    tangent = TangentSpace()
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(tangent.partial_fit, covariances))
+    assert tangent.n_samples_ == 8
+
+    expected_mean = linalg.expm(
+        np.mean([linalg.logm(c).real for c in covariances], axis=0)
+    )
+    np.testing.assert_allclose(tangent.mean_, expected_mean, atol=1e-10)
+    # the reference point is the origin of the tangent space
+    np.testing.assert_allclose(tangent.transform(tangent.mean_), 0, atol=1e-10)
+    projected = tangent.transform(covariances[0])
+    np.testing.assert_allclose(projected, projected.T, atol=1e-12)
+
+
+def test_compute_connectomes_float32():
+    ts = _timeseries(0, n_parcels=50)
+    measures = ["PartialCorrelation", "FisherZ"]
+    reference = compute_connectomes(ts, measures)
+    single = compute_connectomes(ts.astype(np.float32), measures)
+    for measure, relmat in single.items():
+        assert relmat.dtype == np.float32
+    np.testing.assert_allclose(
+        single["covariance"], reference["covariance"], rtol=1e-4, atol=1e-6
+    )
+    for measure in ["PearsonCorrelation", "PartialCorrelation"]:
+        np.testing.assert_allclose(
+            single[measure], reference[measure], atol=1e-5
+        )
+    np.testing.assert_allclose(
+        single["FisherZ"], reference["FisherZ"], atol=1e-4
+    )
+
+
+def test_tangent_space_float32():
+    covariances = [
+        compute_connectomes(_timeseries(seed))["covariance"]
+        for seed in range(8)
+    ]
+    reference, single = TangentSpace(), TangentSpace()
+    for covariance in covariances:
+        reference.partial_fit(covariance)
+        single.partial_fit(covariance.astype(np.float32))
+    assert single._log_sum.dtype == np.float64
+    projected = single.transform(covariances[0].astype(np.float32))
+    assert projected.dtype == np.float32
+    np.testing.assert_allclose(
+        projected, reference.transform(covariances[0]), atol=1e-4
+    )
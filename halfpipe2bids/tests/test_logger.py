@@ -0,0 +1,99 @@
+import json
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from halfpipe2bids import logger
+from halfpipe2bids.logger import hp2b_logger, set_log_file
+from halfpipe2bids.main import main
+
+
+class _CountStr:
+    calls = 0
+
+    def __str__(self):
+        _CountStr.calls += 1
+        return "formatted"
+
+
+def test_lazy_formatting():
+    log = hp2b_logger()
+    level = log.level
+    log.setLevel("INFO")
+    try:
+        log.debug("Renaming %s", _CountStr())
+    finally:
+        log.setLevel(level)
+    assert _CountStr.calls == 0
+
+
+def test_log_file(tmp_path):
+    log = hp2b_logger()
+    level = log.level
+    log.setLevel("DEBUG")
+    set_log_file(tmp_path / "log.jsonl")
+    try:
+        with ThreadPoolExecutor(4) as executor:
+            list(
+                executor.map(
+                    lambda i: log.debug("Renaming %s to %s", i, i + 1),
+                    range(100),
+                )
+            )
+        log.warning("Done")
+    finally:
+        set_log_file(None)  # writes the pending records
+        log.setLevel(level)
+
+    with open(tmp_path / "log.jsonl", "r") as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 101
+    assert sorted(r["message"] for r in records[:-1]) == sorted(
+        f"Renaming {i} to {i + 1}" for i in range(100)
+    )
+    assert records[-1]["level"] == "WARNING"
+    assert records[-1]["logger"] == "halfpipe2bids"
+    assert logging.getLogger("halfpipe2bids").handlers
+
+
+def test_log_file_exception(tmp_path):
+    log = hp2b_logger()
+    set_log_file(tmp_path / "log.jsonl")
+    try:
+        try:
+            raise ValueError("bad parcel")
+        except ValueError:
+            log.exception("Conversion failed")
+    finally:
+        set_log_file(None)
+
+    with open(tmp_path / "log.jsonl", "r") as f:
+        (record,) = [json.loads(line) for line in f]
+    assert record["message"] == "Conversion failed"
+    assert record["exception"].startswith("Traceback")
+    assert "ValueError: bad parcel" in record["exception"]
+
+
+class _SlowHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        time.sleep(0.1)
+        self.messages.append(record.getMessage())
+
+
+def test_errors_written_before_raising(tmp_path):
+    handler = _SlowHandler()
+    logger._start_listener([handler])
+    try:
+        with pytest.raises(ValueError):
+            main([str(tmp_path), str(tmp_path / "output"), "group"])
+        # the errors are written before the traceback
+        assert "No HALFpipe output files found." in handler.messages
+    finally:
+        set_log_file(None)  # back to the console handler
@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from halfpipe2bids.parquet import export_parquet, timeseries_to_frame
+
+pytest.importorskip("pyarrow")
+
+
+RUN_SIDECAR = {
+    "SamplingFrequency": 0.5,
+    "ConfoundRegressors": ["trans_x", "trans_y"],
+    "MeanFramewiseDisplacement": 0.1,
+}
+
+
+def test_timeseries_to_frame(tmp_path, write_bids_timeseries):
+    p = write_bids_timeseries(tmp_path, sidecar=RUN_SIDECAR)
+    long = timeseries_to_frame(p, "long")
+    assert long.columns.tolist() == [
+        "sub",
+        "task",
+        "volume",
+        "parcel",
+        "value",
+    ]
+    assert long.shape[0] == 5 * 3
+    wide = timeseries_to_frame(p, "wide")
+    assert wide.columns.tolist() == ["sub", "task", "volume", "1", "2", "3"]
+    with pytest.raises(ValueError):
+        timeseries_to_frame(p, "diagonal")
+
+
+def test_export_parquet(tmp_path, write_bids_timeseries):
+    for sub in ["01", "02"]:
+        for feature in ["corrMatrix1", "corrMatrix2"]:
+            write_bids_timeseries(tmp_path, sub, feature, sidecar=RUN_SIDECAR)
+
+    parquet_dir = export_parquet(tmp_path)
+    dataset = parquet_dir / "seg-schaefer400_desc-corrMatrix1_timeseries"
+    assert (dataset / "sub-01" / "task-rest").is_dir()
+
+    df = pd.read_parquet(
+        dataset, filters=[("parcel", "=", 2)], columns=["sub", "value"]
+    )
+    assert df.shape == (2 * 5, 2)
+
+    # the labels are not read back as integers
+    df = pd.read_parquet(dataset, filters=[("sub", "=", "01")])
+    assert df.shape == (5 * 3, 5)
+    assert df["sub"].tolist() == ["01"] * 5 * 3
+
+    runs = pd.read_parquet(parquet_dir / "runs.parquet")
+    assert runs.shape[0] == 4
+    assert json.loads(runs.loc[0, "ConfoundRegressors"]) == [
+        "trans_x",
+        "trans_y",
+    ]
+
+    # exporting again replaces the previous export
+    export_parquet(tmp_path)
+    assert pd.read_parquet(dataset).shape[0] == 2 * 5 * 3
@@ -0,0 +1,82 @@
+import shutil
+
+import pytest
+
+from halfpipe2bids.main import main
+from halfpipe2bids.preflight import check_inputs, index_halfpipe_outputs
+
+
+def test_check_inputs(tmp_path, write_halfpipe_timeseries):
+    halfpipe_dir = tmp_path / "halfpipe"
+    write_halfpipe_timeseries(halfpipe_dir)
+    # no atlas entity
+    write_halfpipe_timeseries(halfpipe_dir, atlas=None, sidecar=False)
+
+    index = index_halfpipe_outputs(halfpipe_dir, tmp_path / "output")
+    assert len(index) == 3
+    assert index["size"].sum() == 2 * 4 + 2
+    assert index["dst"].isna().sum() == 1
+
+    errors = check_inputs(
+        index,
+        tmp_path / "spec.json",
+        tmp_path / "atlas.tsv",
+        tmp_path / "atlas.nii.gz",
+        tmp_path / "fmriprep",
+        denoise_metadata=True,
+    )
+    assert len(errors) == 5
+    assert "missing entity 'atlas'" in errors[0]
+    assert "confound file not found" in errors[1]
+    assert all("file not found" in error for error in errors[2:])
+    # the atlas files are only needed by the dataset-level steps
+    errors = check_inputs(
+        index,
+        tmp_path / "spec.json",
+        tmp_path / "atlas.tsv",
+        tmp_path / "atlas.nii.gz",
+        tmp_path / "fmriprep",
+        impute_nan=True,
+    )
+    assert [error.split(":")[0] for error in errors[1:]] == [
+        str(tmp_path / "spec.json"),
+        str(tmp_path / "atlas.tsv"),
+    ]
+
+
+def test_convert_without_atlas(tmp_path, halfpipe_subject_dir):
+    shutil.rmtree(halfpipe_subject_dir / "atlas")
+    output_dir = tmp_path / "output"
+    main([str(halfpipe_subject_dir), str(output_dir), "group"])
+    assert len(list(output_dir.glob("sub-*/**/*.*"))) == 20
+
+    with pytest.raises(ValueError, match="1 problem"):
+        main(
+            [str(halfpipe_subject_dir), str(output_dir), "group"]
+            + ["--sparse-top-k", "5"]
+        )
+
+
+def test_dry_run(tmp_path, capsys, halfpipe_dataset):
+    halfpipe_dir = halfpipe_dataset
+    output_dir = tmp_path / "output"
+    main(
+        [
+            str(halfpipe_dir),
+            str(output_dir),
+            "group",
+            "--dry-run",
+            "--denoise-metadata",
+            "--impute-nan",
+        ]
+    )
+    captured = capsys.readouterr()
+    assert "Conversion plan" in captured.out
+    assert "impute-nan" in captured.out
+    assert "No problem found." in captured.out
+    assert not output_dir.exists()
+
+    with pytest.raises(SystemExit):
+        main([str(tmp_path), str(output_dir), "group", "--dry-run"])
+    captured = capsys.readouterr()
+    assert "No HALFpipe output files found." in captured.out
@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from halfpipe2bids.main import convert_file
+from halfpipe2bids.qc import GroupQC
+from halfpipe2bids.utils import find_bad_rois
+
+
+def test_group_qc(tmp_path, write_halfpipe_timeseries):
+    group_qc = GroupQC()
+    paths = []
+    for feature, content in [
+        ("x", "nan\t1\tnan\t2\n" * 10),
+        ("y", "1\t2\t3\t4\n" * 10),
+    ]:
+        src = write_halfpipe_timeseries(
+            tmp_path / "halfpipe", feature=feature, content=content
+        )
+        dst = (
+            tmp_path
+            / "sub-01"
+            / "func"
+            / f"sub-01_task-rest_seg-schaefer400_desc-{feature}_timeseries.tsv"
+        )
+        # the NaN coverage is collected while converting
+        convert_file(src, dst, group_qc=group_qc)
+        paths.append(dst)
+    _, keep, drop = find_bad_rois(paths, [1, 2, 3, 4])
+    # the first parcel is checked too
+    assert drop == [] and keep == ["1", "2", "3", "4"]
+    group_qc.add_denoise_metadata(
+        paths[0].with_suffix(".json"),
+        {
+            "SamplingFrequency": 0.5,
+            "ConfoundRegressors": ["trans_x", "trans_y"],
+            "NumberOfVolumesDiscardedByMotionScrubbing": 3,
+            "MeanFramewiseDisplacement": 0.1,
+            "MaxFramewiseDisplacement": 0.4,
+        },
+    )
+
+    group_qc.write(tmp_path, parquet=True)
+    df = pd.read_csv(tmp_path / "group_qc.tsv", sep="\t", dtype={"sub": str})
+    assert df[["sub", "task", "seg", "desc"]].values.tolist() == [
+        ["01", "rest", "schaefer400", "x"],
+        ["01", "rest", "schaefer400", "y"],
+    ]
+    assert df["NumberOfVolumes"].tolist() == [10, 10]
+    assert df["ProportionMissingValues"].tolist() == [0.5, 0.0]
+    assert df["NumberOfMissingParcels"].tolist() == [2, 0]
+    assert df["MissingParcels"].tolist()[0] == "1,3"
+    assert df["NumberOfConfoundRegressors"].tolist()[0] == 2
+    assert np.isnan(df["MeanFramewiseDisplacement"].tolist()[1])
+    pd.testing.assert_frame_equal(
+        pd.read_parquet(tmp_path / "group_qc.parquet"), group_qc.to_frame()
+    )
+    with open(tmp_path / "group_qc.json", "r") as f:
+        assert set(json.load(f)) == set(df.columns[4:])
@@ -0,0 +1,59 @@
+import threading
+import time
+
+import pytest
+
+from halfpipe2bids.scheduler import (
+    MemoryBudgetExecutor,
+    parse_memory_size,
+    peak_rss,
+)
+
+
+def test_parse_memory_size():
+    assert parse_memory_size("100") == 100
+    assert parse_memory_size("512M") == 512 * 1024**2
+    assert parse_memory_size("2gb") == 2 * 1024**3
+    assert parse_memory_size("1GiB") == 1024**3
+    with pytest.raises(ValueError):
+        parse_memory_size("lots")
+
+
+def test_memory_budget_executor():
+    lock = threading.Lock()
+    usage = {"current": 0, "peak": 0}
+
+    def task(cost):
+        with lock:
+            usage["current"] += cost
+            usage["peak"] = max(usage["peak"], usage["current"])
+        time.sleep(0.01)
+        with lock:
+            usage["current"] -= cost
+        return cost
+
+    costs = [40, 30, 20, 10, 50, 60, 10, 10]
+    with MemoryBudgetExecutor(mem_budget=60, max_workers=4) as executor:
+        results = executor.run(task, [((c,), c) for c in costs])
+    assert results == costs
+    assert usage["peak"] <= 60
+    assert executor.max_running > 1
+
+    # a task larger than the budget still runs, on its own
+    with MemoryBudgetExecutor(mem_budget=10, max_workers=4) as executor:
+        assert executor.run(task, [((100,), 100), ((5,), 5)]) == [100, 5]
+
+
+def test_memory_budget_executor_error():
+    def task(i):
+        if i == 1:
+            raise RuntimeError("failed")
+        return i
+
+    with MemoryBudgetExecutor(max_workers=2) as executor:
+        with pytest.raises(RuntimeError, match="failed"):
+            executor.run(task, [((i,), 0) for i in range(10)])
+
+
+def test_peak_rss():
+    assert peak_rss() > 0
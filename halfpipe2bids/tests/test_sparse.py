@@ -0,0 +1,96 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scipy import sparse
+
+from halfpipe2bids.main import main
+from halfpipe2bids.sparse import (
+    create_sparse_metadata_json,
+    sparsify,
+    write_sparse_relmat,
+)
+
+
+def _relmat(n_parcels=10):
+    rng = np.random.default_rng(0)
+    mat = np.corrcoef(rng.normal(size=(n_parcels, 50)))
+    return mat
+
+
+def test_sparsify_top_k():
+    mat = _relmat()
+    mask = sparsify(mat, "top-k", 3)
+    assert (mask == mask.T).all()
+    assert not mask.diagonal().any()
+    assert (mask.sum(axis=1) >= 3).all()
+    weights = np.abs(mat)
+    np.fill_diagonal(weights, 0)
+    # the strongest edge of each parcel is always kept
+    assert mask[np.arange(10), weights.argmax(axis=1)].all()
+
+
+def test_sparsify_threshold_proportion():
+    mat = _relmat()
+    mask = sparsify(mat, "threshold", 0.2)
+    upper = np.triu_indices(10, k=1)
+    assert (np.abs(mat[mask]) >= 0.2).all()
+    assert mask[upper].sum() == (np.abs(mat[upper]) >= 0.2).sum()
+
+    mask = sparsify(mat, "proportion", 0.2)
+    assert mask[upper].sum() == 9  # 20% of 45 edges
+    assert not sparsify(mat, "proportion", 0).any()
+
+    mat[0, :] = mat[:, 0] = np.nan
+    assert not sparsify(mat, "threshold", 0)[0].any()
+
+    with pytest.raises(ValueError):
+        sparsify(mat, "random", 1)
+
+
+def test_write_sparse_relmat(tmp_path):
+    mat = _relmat()
+    # parcel 2 removed from the dense connectome
+    labels = [1] + list(range(3, 12))
+    df = pd.DataFrame(mat, columns=[str(label) for label in labels])
+    dst = tmp_path / "sub-1_meas-PearsonCorrelation_relmat.tsv"
+    # the last parcel of the atlas is also missing
+    sparse_dst = write_sparse_relmat(df, dst, "top-k", 2, 12)
+    assert sparse_dst.name == "sub-1_meas-PearsonCorrelationSparse_relmat.npz"
+
+    relmat = sparse.load_npz(sparse_dst).toarray()
+    assert relmat.shape == (12, 12)
+    assert not relmat[1].any() and not relmat[:, 1].any()
+    kept = relmat != 0
+    idx = np.array(labels) - 1
+    np.testing.assert_allclose(
+        relmat[np.ix_(idx, idx)][kept[np.ix_(idx, idx)]],
+        mat[kept[np.ix_(idx, idx)]],
+    )
+
+    create_sparse_metadata_json(tmp_path, "top-k", 2)
+    with open(tmp_path / "meas-PearsonCorrelationSparse_relmat.json") as f:
+        meta = json.load(f)
+    assert meta["StorageFormat"] == "Sparse"
+    assert meta["Sparsification"]["Value"] == 2
+
+
+@pytest.mark.parametrize(
+    "option",
+    [
+        ["--sparse-top-k", "0"],
+        ["--sparse-top-k", "-3"],
+        ["--sparse-threshold", "-1"],
+        ["--sparse-threshold", "nan"],
+        ["--sparse-proportion", "0"],
+        ["--sparse-proportion", "1.5"],
+        ["--sparse-proportion", "-0.2"],
+    ],
+)
+def test_sparse_option_range(tmp_path, capsys, option):
+    with pytest.raises(SystemExit):
+        main([str(tmp_path), str(tmp_path / "output"), "group"] + option)
+    assert f"argument {option[0]}" in capsys.readouterr().err
+    assert not (tmp_path / "output").exists()
@@ -1,4 +1,6 @@
-from halfpipe2bids.utils import regex_to_regressor
+from pathlib import Path
+
+from halfpipe2bids.utils import get_bids_filename, regex_to_regressor
 
 
 def test_regex_to_regressor():
@@ -32,3 +34,15 @@ def test_regex_to_regressor():
         "motion_outlier1",
         "motion_outlier2",
     ]
+
+
+def test_get_bids_filename_compressed():
+    src = Path(
+        "sub-01_task-rest_feature-corrMatrix1_atlas-schaefer400_"
+        "desc-correlation_matrix.tsv.gz"
+    )
+    dst = get_bids_filename(src, Path("out"))
+    assert dst == Path(
+        "out/sub-01/func/sub-01_task-rest_seg-schaefer400_"
+        "desc-corrMatrix1_meas-PearsonCorrelation_relmat.tsv.gz"
+    )
@@ -0,0 +1,76 @@
+import json
+
+from halfpipe2bids.main import main
+from halfpipe2bids.watch import SubjectWatcher, watch
+
+
+def test_subject_watcher(tmp_path, write_halfpipe_timeseries):
+    watcher = SubjectWatcher(tmp_path)
+    write_halfpipe_timeseries(tmp_path, "01", "corrMatrix1")
+    write_halfpipe_timeseries(tmp_path, "02", "corrMatrix1", sidecar=False)
+    assert watcher.poll() == ([], True)
+    # sub-02 misses a sidecar
+    assert watcher.poll() == (["sub-01"], False)
+    watcher.mark_converted("sub-01")
+    assert watcher.poll() == ([], False)
+    assert watcher.pending == ["sub-02"]
+
+    # new outputs for an already converted subject
+    write_halfpipe_timeseries(tmp_path, "01", "corrMatrix2")
+    write_halfpipe_timeseries(tmp_path, "02", "corrMatrix1")
+    assert watcher.poll() == ([], True)
+    assert watcher.poll() == (["sub-01", "sub-02"], False)
+
+
+def test_watch(tmp_path, write_halfpipe_timeseries):
+    now = [0.0]
+    converted = []
+    # HALFpipe writes one subject per poll
+    halfpipe_runs = [
+        lambda: write_halfpipe_timeseries(tmp_path, "01", "corrMatrix1"),
+        lambda: write_halfpipe_timeseries(
+            tmp_path, "02", "corrMatrix1", sidecar=False
+        ),
+        lambda: write_halfpipe_timeseries(tmp_path, "03", "corrMatrix1"),
+    ]
+
+    def sleep(seconds):
+        now[0] += seconds
+        if halfpipe_runs:
+            halfpipe_runs.pop(0)()
+
+    incomplete = watch(
+        tmp_path,
+        converted.append,
+        interval=10,
+        timeout=30,
+        sleep=sleep,
+        clock=lambda: now[0],
+    )
+    assert converted == ["sub-01", "sub-03"]
+    assert incomplete == ["sub-02"]
+    assert now[0] == 60
+
+
+def test_watch_cli(tmp_path, halfpipe_subject_dir):
+    halfpipe_dir = halfpipe_subject_dir
+    output_dir = tmp_path / "output"
+    main(
+        [
+            str(halfpipe_dir),
+            str(output_dir),
+            "group",
+            "--watch",
+            "--watch-interval",
+            "0",
+            "--watch-timeout",
+            "0",
+            "--log-file",
+            str(tmp_path / "log.jsonl"),
+        ]
+    )
+    assert len(list(output_dir.glob("sub-10159/func/*_relmat.tsv"))) == 10
+    assert (output_dir / "dataset_description.json").exists()
+    with open(tmp_path / "log.jsonl", "r") as f:
+        messages = [json.loads(line)["message"] for line in f]
+    assert "Converting sub-10159" in messages
@@ -0,0 +1,36 @@
+import gzip
+
+import numpy as np
+import pandas as pd
+
+from halfpipe2bids.writers import compress_gzip, tsv_path, write_tsv
+
+
+def test_compress_gzip():
+    data = np.random.default_rng(0).bytes(10_000)
+    # several blocks compressed in parallel are read back as one stream
+    compressed = compress_gzip(data, block_size=1_000)
+    assert gzip.decompress(compressed) == data
+    # output does not depend on the time of compression
+    assert compress_gzip(data, block_size=1_000) == compressed
+    assert gzip.decompress(compress_gzip(b"")) == b""
+
+
+def test_tsv_path(tmp_path):
+    assert tsv_path(tmp_path / "a_relmat.tsv", True).name == "a_relmat.tsv.gz"
+    assert tsv_path(tmp_path / "a_relmat.tsv.gz").name == "a_relmat.tsv"
+    assert tsv_path(tmp_path / "a_relmat.tsv").name == "a_relmat.tsv"
+
+
+def test_write_tsv(tmp_path):
+    df = pd.DataFrame(
+        np.random.default_rng(0).normal(size=(20, 4)), columns=range(1, 5)
+    )
+    df.iloc[0, 0] = np.nan
+    plain = write_tsv(df, tmp_path / "x_timeseries.tsv", index=False)
+    compressed = write_tsv(df, plain, compress=True, index=False)
+    assert compressed.name == "x_timeseries.tsv.gz"
+    assert not plain.exists()  # stale uncompressed copy removed
+    roundtrip = pd.read_csv(compressed, sep="\t", na_values="nan")
+    assert roundtrip.columns.tolist() == ["1", "2", "3", "4"]
+    np.testing.assert_allclose(roundtrip.values, df.values)
@@ -4,7 +4,10 @@ import pandas as pd
 import re
 from halfpipe2bids import __version__
 
+from halfpipe2bids.archive import read_tsv
+from halfpipe2bids.checksums import MANIFEST_NAME
 from halfpipe2bids.logger import hp2b_logger
+from halfpipe2bids.writers import write_json
 
 hp2b_log = hp2b_logger()
 hp2b_url = "https://github.com/LAB-BRIGHT/HalfPipe2Bids"
@@ -34,7 +37,7 @@ dataset_description = {
 }
 
 meas_meta = {
-    "covariates": {
+    "covariance": {
         "Measure": "Covariance",
         "MeasureDescription": "Covariance",
         "Weighted": False,
@@ -54,6 +57,39 @@ meas_meta = {
         "NonNegative": "",
         "Code": "HALFPipe",
     },
+    "PartialCorrelation": {
+        "Measure": "Partial correlation",
+        "MeasureDescription": "Partial correlation from the inverse of the "
+        "Ledoit-Wolf covariance",
+        "Weighted": False,
+        "Directed": False,
+        "ValidDiagonal": True,
+        "StorageFormat": "Full",
+        "NonNegative": "",
+        "Code": "nilearn",
+    },
+    "FisherZ": {
+        "Measure": "Fisher z-transformed Pearson correlation",
+        "MeasureDescription": "arctanh of the Pearson correlation",
+        "Weighted": False,
+        "Directed": False,
+        "ValidDiagonal": False,
+        "StorageFormat": "Full",
+        "NonNegative": "",
+        "Code": "Halfpipe2Bids",
+    },
+    "Tangent": {
+        "Measure": "Tangent space embedding",
+        "MeasureDescription": "Covariance projected to the tangent space at "
+        "the log-Euclidean mean of the covariances of all subjects with the "
+        "same task, atlas and denoising feature",
+        "Weighted": False,
+        "Directed": False,
+        "ValidDiagonal": True,
+        "StorageFormat": "Full",
+        "NonNegative": "",
+        "Code": "Halfpipe2Bids",
+    },
 }
 
 
@@ -94,7 +130,12 @@ def regex_to_regressor(regex_confounds, confounds_columns):
     return [col for col in confounds_columns if pattern.fullmatch(col)]
 
 
-def find_bad_rois(timeseries_paths, atlas_label, parcel_removal_threshold=0.5):
+def find_bad_rois(
+    timeseries_paths,
+    atlas_label,
+    parcel_removal_threshold=0.5,
+    dtype=None,
+):
     """
     Find out how many subject miss the same roi report in proportion of the
     dataset.
@@ -106,6 +147,8 @@ def find_bad_rois(timeseries_paths, atlas_label, parcel_removal_threshold=0.5):
             1.0 = all subjects in the dataset miss a given parcel.
             0.0 = all subjects in the dataset has a given parcel.
             Default: 0.5
+        dtype (str): Precision used to read the time series, e.g.
+            "float32". Default: float64.
 
     Returns:
         pandas.DataFrame: proportion of the dataset with nan per parcel.
@@ -116,8 +159,8 @@ def find_bad_rois(timeseries_paths, atlas_label, parcel_removal_threshold=0.5):
     total_subjects = len(timeseries_paths)
 
     for p in timeseries_paths:
-        df = pd.read_csv(p, sep="\t", header=0, index_col=0, na_values="nan")
-        subject_roi_missing = (pd.isna(df).sum() / df.shape[0]) == 1
+        df = pd.read_csv(p, sep="\t", header=0, na_values="nan", dtype=dtype)
+        subject_roi_missing = pd.isna(df).all(axis=0)
         for label in df.columns[subject_roi_missing]:
             per_roi_nan_counter[label][0] += 1
 
@@ -135,23 +178,23 @@ def find_bad_rois(timeseries_paths, atlas_label, parcel_removal_threshold=0.5):
 
 
 def create_dataset_metadata_json(
-    output_dir, halfpipe_spec, path_atlas_nii
+    output_dir, halfpipe_spec, path_atlas_nii, measures=None
 ) -> None:
     """
     Create dataset-level metadata JSON files for BIDS.
     Args:
         output_dir (Path): path to the output directory where the JSON file
         will be saved.
+        measures (list[str]): connectivity measures to describe. Default:
+        all measures in `meas_meta`.
     """
     # create the dataset_description.json file
     hp2b_log.info(f"Creating {output_dir / 'dataset_description.json'}")
-    with open(output_dir / "dataset_description.json", "w") as f:
-        json.dump(dataset_description, f, indent=4)
+    write_json(dataset_description, output_dir / "dataset_description.json")
 
-    for meas in meas_meta:
+    for meas in measures or meas_meta:
         meas_path = output_dir / f"meas-{meas}_relmat.json"
-        with open(meas_path, "w") as f:
-            json.dump(meas_meta[meas], f, indent=4)
+        write_json(meas_meta[meas], meas_path)
         hp2b_log.info(f"Exported {meas} metadata to {meas_path}")
 
     seg_meta = {
@@ -160,10 +203,29 @@ def create_dataset_metadata_json(
         if entry.get("suffix", False)
     }
 
-    with open(
-        output_dir / f"seg-{seg_meta['File']['tags']['desc']}.json", "w"
-    ) as f:
-        json.dump(seg_meta, f, indent=4)
+    write_json(
+        seg_meta, output_dir / f"seg-{seg_meta['File']['tags']['desc']}.json"
+    )
+
+
+def add_checksums_provenance(output_dir) -> None:
+    """
+    Describe the checksum manifest in the Halfpipe2Bids entry of
+    `GeneratedBy` in dataset_description.json.
+
+    Args:
+        output_dir (Path): The BIDS output directory.
+    """
+    path = output_dir / "dataset_description.json"
+    with open(path, "r") as f:
+        description = json.load(f)
+    for generated_by in description["GeneratedBy"]:
+        if generated_by["Name"] == "Halfpipe2Bids":
+            generated_by["Checksums"] = {
+                "Algorithm": "SHA256",
+                "File": MANIFEST_NAME,
+            }
+    write_json(description, path)
 
 
 def load_atlas_info_tsv(path_atlas_label):
@@ -173,19 +235,29 @@ def load_atlas_info_tsv(path_atlas_label):
     There's no header in the file.
 
     Args:
-        path_atlas_label (Path): Path to the file.
+        path_atlas_label (Path | ArchivePath): Path to the file.
 
     Returns:
         pandas.DataFrame:
     """
-    atlas_label = pd.read_csv(
-        path_atlas_label, sep="\t", header=None, index_col=0
-    )
+    atlas_label = read_tsv(path_atlas_label, header=None, index_col=0)
     atlas_label.columns = ["parcel_name"]
     atlas_label.index.name = "parcel_index"
     return atlas_label
 
 
+def get_bids_entities(path):
+    """
+    Extract the BIDS entities of a converted file as a dictionary.
+
+    >>> from pathlib import Path
+    >>> get_bids_entities(Path("sub-1_task-rest_seg-a_desc-b_timeseries.tsv"))
+    {'sub': '1', 'task': 'rest', 'seg': 'a', 'desc': 'b'}
+    """
+    name = path.name.split(".")[0]
+    return dict(re.findall(regex_bids_entity, name))
+
+
 def get_bids_filename(src, output_dir):
     """
     Generates a BIDS-compliant filename based on the source file's name
@@ -214,10 +286,14 @@ def get_bids_filename(src, output_dir):
     """
 
     # rename files to match BIDS naming conventions
-    entities = re.findall(regex_bids_entity, src.stem)
-    entities = {entity[0]: entity[1] for entity in entities}
+    stem = src.stem
     extension = src.suffix
-    suffix = src.stem.split("_")[-1]
+    if src.name.endswith(".tsv.gz"):
+        stem = stem[: -len(".tsv")]
+        extension = ".tsv.gz"
+    entities = re.findall(regex_bids_entity, stem)
+    entities = {entity[0]: entity[1] for entity in entities}
+    suffix = stem.split("_")[-1]
 
     if entities.get("sub", False):
         output_dir = output_dir / f"sub-{entities['sub']}" / "func"
@@ -243,26 +319,43 @@ def get_bids_filename(src, output_dir):
     return output_dir / f"{new_basename}{new_suffix_info}"
 
 
-def populate_timeseries_json(path_timeseries_json, fmriprep_dir):
-    """Add additional meta data for denoising metric calculation to the
-    existing json file.
+def get_confound_file(path_timeseries, fmriprep_dir):
+    """Find the fMRIPrep confound file associated with a timeseries.
 
     Args:
-        path_timeseries_json (Path): Path to the meta data file.
+        path_timeseries (Path): Path to a timeseries or its meta data file.
         fmriprep_dir (Path): Associated fmriprep directory.
 
     Returns:
-        None
+        Path: Path to the fMRIPrep confound file.
     """
-    sub = path_timeseries_json.stem.split("sub-")[-1].split("_")[0]
-    task = path_timeseries_json.stem.split("task-")[-1].split("_")[0]
-    confound_file = (
+    sub = path_timeseries.stem.split("sub-")[-1].split("_")[0]
+    task = path_timeseries.stem.split("task-")[-1].split("_")[0]
+    return (
         fmriprep_dir
         / f"sub-{sub}"
         / "func"
         / f"sub-{sub}_task-{task}_desc-confounds_timeseries.tsv"
     )
-    confounds = pd.read_csv(confound_file, sep="\t")
+
+
+def populate_timeseries_json(
+    path_timeseries_json, fmriprep_dir, confounds_content=None
+):
+    """Add additional meta data for denoising metric calculation to the
+    existing json file.
+
+    Args:
+        path_timeseries_json (Path): Path to the meta data file.
+        fmriprep_dir (Path | ArchivePath): Associated fmriprep directory.
+        confounds_content (bytes): Content of the confound file, if it was
+            already read from an archive.
+
+    Returns:
+        dict: The metadata added.
+    """
+    confound_file = get_confound_file(path_timeseries_json, fmriprep_dir)
+    confounds = read_tsv(confound_file, confounds_content)
     extra_meta = {}
     with open(path_timeseries_json, "r") as f:
         timeseries_meta = json.load(f)
@@ -289,9 +382,9 @@ def populate_timeseries_json(path_timeseries_json, fmriprep_dir):
     extra_meta["MeanFramewiseDisplacement"] = confounds[
         "framewise_displacement"
     ].mean()
-    extra_meta["MaxFramewiseDisplacement"] = (
-        confounds["framewise_displacement"].max(),
-    )
+    extra_meta["MaxFramewiseDisplacement"] = confounds[
+        "framewise_displacement"
+    ].max()
     timeseries_meta.update(extra_meta)
-    with open(path_timeseries_json, "w") as f:
-        json.dump(timeseries_meta, f, indent=4)
+    write_json(timeseries_meta, path_timeseries_json)
+    return extra_meta
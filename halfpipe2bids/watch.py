@@ -0,0 +1,156 @@
+"""Convert subjects as soon as HALFpipe has finished writing them."""
+
+from __future__ import annotations
+
+import time
+
+from halfpipe2bids.logger import hp2b_logger
+
+hp2b_log = hp2b_logger()
+
+
+def subject_signature(subject_dir):
+    """
+    Name, size and modification time of all files of a subject.
+
+    Args:
+        subject_dir (Path): HALFpipe directory of one subject.
+
+    Returns:
+        tuple: Sorted file signatures, identical as long as no file changes.
+    """
+    signature = []
+    for path in subject_dir.glob("**/sub-*.*"):
+        stat = path.stat()
+        signature.append(
+            (
+                path.relative_to(subject_dir).as_posix(),
+                stat.st_size,
+                stat.st_mtime_ns,
+            )
+        )
+    return tuple(sorted(signature))
+
+
+def is_subject_complete(signature):
+    """
+    Check every timeseries of a subject has its metadata and vice versa.
+
+    HALFpipe writes the timeseries and its JSON sidecar for each feature, a
+    missing half means the feature is still being written.
+
+    >>> is_subject_complete((("a_timeseries.tsv", 1, 0),))
+    False
+    >>> is_subject_complete(
+    ...     (("a_timeseries.json", 1, 0), ("a_timeseries.tsv", 1, 0))
+    ... )
+    True
+    """
+    timeseries, sidecars = set(), set()
+    for name, _, _ in signature:
+        stem = name.removesuffix(".gz")
+        if stem.endswith("_timeseries.tsv"):
+            timeseries.add(stem.removesuffix(".tsv"))
+        elif stem.endswith("_timeseries.json"):
+            sidecars.add(stem.removesuffix(".json"))
+    return bool(timeseries) and timeseries == sidecars
+
+
+class SubjectWatcher:
+    """
+    Poll the HALFpipe output directory for subjects ready to convert.
+
+    A subject is ready when it is complete (see `is_subject_complete`) and
+    none of its files changed since the previous poll. A subject whose files
+    change after it was converted is reported again.
+
+    Args:
+        path_halfpipe_timeseries (Path): HALFpipe derivatives directory.
+    """
+
+    def __init__(self, path_halfpipe_timeseries):
+        self.path_halfpipe_timeseries = path_halfpipe_timeseries
+        self.signatures = {}
+        self.converted = {}
+
+    def poll(self):
+        """
+        Look for new and ready subjects.
+
+        Returns:
+            tuple[list[str], bool]: Subjects ready to be converted, and
+                whether any file changed since the previous poll.
+        """
+        ready, changed = [], False
+        for subject_dir in sorted(self.path_halfpipe_timeseries.glob("sub-*")):
+            if not subject_dir.is_dir():
+                continue
+            subject = subject_dir.name
+            signature = subject_signature(subject_dir)
+            previous = self.signatures.get(subject)
+            self.signatures[subject] = signature
+            if signature != previous:
+                changed = True
+            elif (
+                is_subject_complete(signature)
+                and self.converted.get(subject) != signature
+            ):
+                ready.append(subject)
+        return ready, changed
+
+    def mark_converted(self, subject):
+        self.converted[subject] = self.signatures[subject]
+
+    @property
+    def pending(self):
+        """Subjects found but not converted in their current state."""
+        return [
+            subject
+            for subject, signature in self.signatures.items()
+            if self.converted.get(subject) != signature
+        ]
+
+
+def watch(
+    path_halfpipe_timeseries,
+    convert_subject,
+    interval=60,
+    timeout=3600,
+    sleep=time.sleep,
+    clock=time.monotonic,
+):
+    """
+    Convert each subject as soon as HALFpipe is done with it.
+
+    The directory is polled every `interval` seconds. Watching stops once
+    no file was added or changed for `timeout` seconds and every complete
+    subject is converted.
+
+    Args:
+        path_halfpipe_timeseries (Path): HALFpipe derivatives directory.
+        convert_subject (Callable[[str], None]): Converts one subject,
+            given its directory name (e.g. "sub-01").
+        interval (float): Seconds between two polls.
+        timeout (float): Seconds without change before stopping.
+
+    Returns:
+        list[str]: Subjects left unconverted because they never completed.
+    """
+    watcher = SubjectWatcher(path_halfpipe_timeseries)
+    last_change = clock()
+    while True:
+        ready, changed = watcher.poll()
+        if changed:
+            last_change = clock()
+        for subject in ready:
+            hp2b_log.info("Converting %s", subject)
+            convert_subject(subject)
+            watcher.mark_converted(subject)
+        if not changed and clock() - last_change >= timeout:
+            break
+        sleep(interval)
+
+    incomplete = watcher.pending
+    for subject in incomplete:
+        hp2b_log.warning("%s is incomplete and was not converted.", subject)
+    return incomplete
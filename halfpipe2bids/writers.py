@@ -0,0 +1,144 @@
+"""Write output files, optionally gzip compressed.
+
+All output files are written through this module so their checksum is
+computed from the bytes being written (see `halfpipe2bids.checksums`).
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from halfpipe2bids.checksums import CHUNK_SIZE, record_checksum
+
+# gzip members are compressed independently; 1 MiB blocks keep the ratio
+# within a fraction of a percent of single-stream gzip.
+GZIP_BLOCK_SIZE = 2**20
+# Formatted floats compress to ~47% at level 1 and ~43% at level 6, but
+# level 1 is five times faster and stays well below the cost of `to_csv`.
+GZIP_LEVEL = 1
+
+_gzip_executor = None
+
+
+def _get_gzip_executor() -> ThreadPoolExecutor:
+    global _gzip_executor
+    if _gzip_executor is None:
+        _gzip_executor = ThreadPoolExecutor(
+            max_workers=os.cpu_count(), thread_name_prefix="hp2b-gzip"
+        )
+    return _gzip_executor
+
+
+def compress_gzip(data, block_size=GZIP_BLOCK_SIZE, level=GZIP_LEVEL):
+    """
+    Compress data to gzip, using several threads for large inputs.
+
+    The data is split into blocks that are compressed in parallel and
+    concatenated as gzip members (as done by pigz). Any gzip reader
+    decompresses the result as a single stream. The modification time in
+    the header is set to 0 so the output is reproducible.
+
+    Args:
+        data (bytes): Data to compress.
+        block_size (int): Size of the independently compressed blocks.
+        level (int): Compression level, from 1 (fast) to 9 (small).
+
+    Returns:
+        bytes: gzip compressed data.
+    """
+    compress = partial(gzip.compress, compresslevel=level, mtime=0)
+    if len(data) <= block_size:
+        return compress(data)
+    starts = range(0, len(data), block_size)
+    ends = range(block_size, len(data) + block_size, block_size)
+    blocks = [data[start:end] for start, end in zip(starts, ends)]
+    return b"".join(_get_gzip_executor().map(compress, blocks))
+
+
+def write_bytes(dst, content):
+    """
+    Write bytes to a file and record their checksum.
+
+    Args:
+        dst (Path): Output path.
+        content (bytes): Content of the file.
+
+    Returns:
+        Path: The path of the written file.
+    """
+    with open(dst, "wb") as f:
+        f.write(content)
+    record_checksum(dst, hashlib.sha256(content).hexdigest())
+    return dst
+
+
+def write_json(data, dst):
+    """Write a JSON file indented by 4 spaces."""
+    return write_bytes(dst, json.dumps(data, indent=4).encode())
+
+
+def copy_file(src, dst):
+    """
+    Copy a file with its metadata, computing its checksum on the way.
+
+    Args:
+        src (Path): File to copy.
+        dst (Path): Output path.
+
+    Returns:
+        Path: The path of the copy.
+    """
+    sha256 = hashlib.sha256()
+    with open(src, "rb") as f_src, open(dst, "wb") as f_dst:
+        while chunk := f_src.read(CHUNK_SIZE):
+            sha256.update(chunk)
+            f_dst.write(chunk)
+    shutil.copystat(src, dst)
+    record_checksum(dst, sha256.hexdigest())
+    return dst
+
+
+def tsv_path(path, compress=False):
+    """
+    Set the extension of a TSV path to `.tsv.gz` or `.tsv`.
+
+    Args:
+        path (Path): Path ending with `.tsv` or `.tsv.gz`.
+        compress (bool): Use the compressed extension.
+
+    Returns:
+        Path: The path with the requested extension.
+    """
+    name = path.name.removesuffix(".gz").removesuffix(".tsv")
+    return path.with_name(f"{name}.tsv.gz" if compress else f"{name}.tsv")
+
+
+def write_tsv(df, dst, compress=False, **kwargs):
+    """
+    Write a data frame as a BIDS TSV file.
+
+    Args:
+        df (pandas.DataFrame): Data to write.
+        dst (Path): Output path. The extension is set according to
+            `compress`.
+        compress (bool): Write a gzip compressed `.tsv.gz` file.
+        **kwargs: Extra arguments passed to `pandas.DataFrame.to_csv`.
+
+    Returns:
+        Path: The path of the written file.
+    """
+    dst = tsv_path(dst, compress)
+    content = df.to_csv(sep="\t", na_rep="nan", **kwargs).encode()
+    if compress:
+        content = compress_gzip(content)
+    write_bytes(dst, content)
+    # do not leave a stale copy with the other extension from a former run
+    tsv_path(dst, not compress).unlink(missing_ok=True)
+    return dst